@@ -0,0 +1,100 @@
+"""Micro-benchmark: reading custom fields and their protected flags.
+
+Compares the per-field XPath lookup kp2bw used before with the single pass
+in ``kp2bw.convert.read_strings``, which the conversion runs on every entry,
+on a synthetic database.
+
+    python benchmarks/bench_protected_fields.py -entries 50000 -fields 30
+"""
+import base64
+import copy
+import os
+import sys
+import tempfile
+import time
+import uuid
+from argparse import ArgumentParser
+
+from lxml.builder import E
+from pykeepass import create_database
+from pykeepass.entry import reserved_keys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from kp2bw.convert import read_strings
+
+
+def xpath_escape(text):
+    if "'" not in text:
+        return "'{}'".format(text)
+    if '"' not in text:
+        return '"{}"'.format(text)
+    parts = text.split("'")
+    inner = ", \"'\", ".join("'{}'".format(p) for p in parts)
+    return "concat({})".format(inner)
+
+
+def read_custom_properties_xpath(entry):
+    properties = entry.custom_properties
+    protected = set()
+    for field in properties:
+        if entry._xpath('String[Key[text()={}]]/Value'.format(xpath_escape(field)), first=True).attrib.get("Protected", "False") == "True":
+            protected.add(field)
+    return properties, protected
+
+
+def read_custom_properties(entry):
+    # the custom fields as Converter._transform_entry takes them from read_strings
+    strings, protected = read_strings(entry._element)
+    properties = {key: value for key, value in strings.items() if key not in reserved_keys}
+    return properties, protected.intersection(properties)
+
+
+def build_database(path, entries, fields):
+    kp = create_database(path, password="benchmark")
+    group = kp.add_group(kp.root_group, "Benchmark")
+
+    template = kp.add_entry(group, "template", "user", "password")
+    for i in range(fields):
+        template._element.append(E.String(E.Key(f"field {i}"), E.Value(f"value {i}", Protected="True" if i % 3 == 0 else "False")))
+    template_element = template._element
+    group._element.remove(template_element)
+
+    for _ in range(entries):
+        element = copy.deepcopy(template_element)
+        element.find("UUID").text = base64.b64encode(uuid.uuid4().bytes).decode("ascii")
+        group._element.append(element)
+
+    return kp
+
+
+def _time(func, entries):
+    start = time.perf_counter()
+    for entry in entries:
+        func(entry)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark protected custom field detection")
+    parser.add_argument('-entries', dest='entries', default=50000, type=int)
+    parser.add_argument('-fields', dest='fields', default=30, type=int)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="kp2bw-bench-") as tmp:
+        kp = build_database(os.path.join(tmp, "bench.kdbx"), args.entries, args.fields)
+        entries = kp.entries
+
+        # both implementations must agree
+        for entry in entries[:100]:
+            assert read_custom_properties(entry) == read_custom_properties_xpath(entry)
+
+        single_pass = _time(read_custom_properties, entries)
+        xpath = _time(read_custom_properties_xpath, entries)
+
+    print(f"{len(entries)} entries x {args.fields} custom fields")
+    print(f"  per-field xpath: {xpath:8.2f}s")
+    print(f"  single pass:     {single_pass:8.2f}s  ({xpath / single_pass:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
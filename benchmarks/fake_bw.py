@@ -0,0 +1,143 @@
+"""Offline stand-in for the Bitwarden cli, including ``bw serve``.
+
+Answers the commands kp2bw uses with plausible output after sleeping
+``FAKE_BW_LATENCY`` seconds per call (or per request when serving). It keeps
+no vault: listings are empty and created objects are echoed back with a new
+id, so its cost does not grow with the number of items.
+"""
+import json
+import os
+import sys
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+LATENCY = float(os.environ.get("FAKE_BW_LATENCY", "0"))
+
+
+def _create(kind, obj, query=None):
+    obj = dict(obj or {})
+    obj["id"] = str(uuid.uuid4())
+    if kind == "item":
+        obj.setdefault("attachments", [])
+    return obj
+
+
+def _attachment(item_id, filename, size):
+    return {"id": item_id, "attachments": [{"id": str(uuid.uuid4()), "fileName": filename, "size": str(size)}]}
+
+
+def _upload(content_type, body):
+    """Return (filename, data) of the ``file`` field of a multipart body."""
+    message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body)
+    for part in message.iter_parts():
+        if part.get_param("name", header="content-disposition") == "file":
+            return part.get_filename(), part.get_payload(decode=True)
+    raise ValueError("no file in the upload")
+
+
+def _split(args):
+    positionals = []
+    options = {}
+    rest = iter(args)
+    for arg in rest:
+        if arg.startswith("--"):
+            options[arg[2:]] = None if arg in ("--raw", "--version") else next(rest, None)
+        else:
+            positionals.append(arg)
+    return positionals, options
+
+
+def cli(args):
+    time.sleep(LATENCY)
+    positionals, options = _split(args)
+
+    if "version" in options:
+        return "2024.1.0 (fake bitwarden cli)"
+    if not positionals:
+        return ""
+
+    command = positionals[0]
+    if command == "unlock":
+        sys.stdin.read()
+        return "FAKESESSION"
+    if command == "sync":
+        return "Syncing complete."
+    if command == "list":
+        return "[]"
+    if command == "get":
+        return json.dumps({"organizationId": None, "name": "", "externalId": None, "groups": []})
+    if command == "create" and positionals[1] == "attachment":
+        return json.dumps(_attachment(options["itemid"], os.path.basename(options["file"]), os.path.getsize(options["file"])))
+    if command in ("create", "edit"):
+        return json.dumps(_create(positionals[1], json.loads(sys.stdin.buffer.read())))
+    if command == "delete":
+        return ""
+    if command == "import":
+        return "Imported " + positionals[2]
+    if command == "serve":
+        serve(options.get("hostname") or "localhost", int(options.get("port") or 8087))
+        return ""
+
+    sys.stderr.write(f"error: unsupported fake command {' '.join(args)}\n")
+    sys.exit(1)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, avoid nagle stalls
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, data):
+        body = json.dumps({"success": True, "data": data}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        time.sleep(LATENCY)
+        path = urlparse(self.path).path
+        if path.startswith("/list/object/"):
+            return self._reply({"object": "list", "data": []})
+        if path.startswith("/object/template/"):
+            return self._reply({"object": "template", "template": json.loads(cli(["get", "template", "org-collection"]))})
+        return self._reply({"object": "template", "template": {"status": "unlocked"}})
+
+    def do_POST(self):
+        time.sleep(LATENCY)
+        url = urlparse(self.path)
+        body = self._body()
+        if url.path == "/sync":
+            return self._reply(None)
+        if url.path == "/attachment":
+            query = parse_qs(url.query)
+            filename, data = _upload(self.headers["Content-Type"], body)
+            return self._reply(_attachment(query["itemid"][0], filename, len(data)))
+        return self._reply(_create(url.path.rsplit("/", 1)[-1], json.loads(body)))
+
+    def do_PUT(self):
+        time.sleep(LATENCY)
+        return self._reply(json.loads(self._body()))
+
+    def do_DELETE(self):
+        time.sleep(LATENCY)
+        return self._reply(None)
+
+
+def serve(hostname, port):
+    ThreadingHTTPServer((hostname, port), _Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    print(cli(sys.argv[1:]))
@@ -0,0 +1,168 @@
+"""Offline throughput benchmark for kp2bw.
+
+Generates a synthetic KeePass db, puts ``fake_bw.py`` on the PATH as ``bw``
+and runs the Converter once per scenario, each in a fresh process. Reports
+entries/sec, peak RSS and the time spent in _load_keepass_data,
+_resolve_entries_with_references and _create_bitwarden_items_for_entries.
+
+    python benchmarks/run.py -entries 5000 -latency 0.005
+    python benchmarks/run.py -save results.json
+    python benchmarks/run.py -baseline benchmarks/baseline.json
+
+Note that the fake cli keeps no vault, so with -batch the imported items are
+not listed back and their attachments are not uploaded.
+"""
+import json
+import logging
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import SUPPRESS, ArgumentParser
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+SCENARIOS = {
+    "cli": {},
+    "cli-jobs4": {"jobs": 4},
+    "serve": {"bitwarden_serve": True},
+    "serve-jobs8": {"bitwarden_serve": True, "jobs": 8},
+    "serve-parse4": {"bitwarden_serve": True, "parse_workers": 4},
+    "batch": {"batch_size": 500},
+}
+
+# RunStats phase -> Converter method
+PHASES = {
+    "load": "_load_keepass_data",
+    "resolve": "_resolve_entries_with_references",
+    "upload": "_create_bitwarden_items_for_entries",
+}
+
+
+def _install_fake_bw(directory):
+    if os.name == "nt":
+        path = os.path.join(directory, "bw.cmd")
+        with open(path, "w") as f:
+            f.write(f'@"{sys.executable}" "{os.path.join(BENCH_DIR, "fake_bw.py")}" %*\n')
+    else:
+        path = os.path.join(directory, "bw")
+        with open(path, "w") as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.join(BENCH_DIR, "fake_bw.py")}" "$@"\n')
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+
+def _peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_scenario(db_path, options):
+    """Run one conversion in this process and return its figures."""
+    from kp2bw.convert import Converter
+
+    stats_path = db_path + ".stats.json"
+    converter = Converter(
+        keepass_file_path=db_path,
+        keepass_password="benchmark",
+        keepass_keyfile_path=None,
+        bitwarden_password="benchmark",
+        bitwarden_organization_id=None,
+        bitwarden_coll_id=None,
+        path2name=True,
+        path2nameskip=1,
+        import_tags=None,
+        stats_file_path=stats_path,
+        **options)
+
+    start = time.perf_counter()
+    converter.convert()
+    wall = time.perf_counter() - start
+
+    with open(stats_path) as f:
+        stats = json.load(f)
+    entries = stats["counters"].get("entries", 0)
+
+    return {
+        "entries": entries,
+        "wall_s": wall,
+        "entries_per_s": entries / wall if wall else 0,
+        "peak_rss_mb": _peak_rss_mb(),
+        "phases_s": {method: stats["phases_s"].get(phase, 0.0) for phase, method in PHASES.items()},
+        "calls": {command: call["count"] for command, call in stats["calls"].items()},
+    }
+
+
+def _compare(results, baseline):
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        print(f"{name}: vs baseline")
+        for key in ("entries_per_s", "peak_rss_mb", "wall_s"):
+            if base.get(key):
+                change = (result[key] - base[key]) / base[key] * 100
+                print(f"  {key:14} {base[key]:10.2f} -> {result[key]:10.2f}  ({change:+.1f}%)")
+
+
+def main():
+    parser = ArgumentParser(description="Offline kp2bw benchmark")
+    parser.add_argument('-entries', dest='entries', default=500, type=int)
+    parser.add_argument('-fields', dest='fields', default=5, type=int)
+    parser.add_argument('-ref_ratio', dest='ref_ratio', default=0.05, type=float)
+    parser.add_argument('-attachment_ratio', dest='attachment_ratio', default=0.1, type=float)
+    parser.add_argument('-attachment_size', dest='attachment_size', default=4096, type=int)
+    parser.add_argument('-latency', dest='latency', default=0.0, type=float, help='Seconds the fake bw sleeps per call')
+    parser.add_argument('-scenario', dest='scenarios', nargs='+', choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument('-save', dest='save', default=None, help='Write the results as JSON to this file')
+    parser.add_argument('-baseline', dest='baseline', default=None, help='Compare with results saved earlier')
+    parser.add_argument('-child', dest='child', default=None, help=SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        db_path, options = json.loads(args.child)
+        logging.basicConfig(level=logging.WARNING)
+        print(json.dumps(run_scenario(db_path, options)))
+        return
+
+    from synthetic import build_database
+
+    config = {key: getattr(args, key) for key in ("entries", "fields", "ref_ratio", "attachment_ratio", "attachment_size", "latency")}
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="kp2bw-bench-") as tmp:
+        db_path = os.path.join(tmp, "bench.kdbx")
+        build_database(db_path, entries=args.entries, fields=args.fields, ref_ratio=args.ref_ratio,
+            attachment_ratio=args.attachment_ratio, attachment_size=args.attachment_size)
+        _install_fake_bw(tmp)
+
+        env = dict(os.environ)
+        env["PATH"] = tmp + os.pathsep + env.get("PATH", "")
+        env["FAKE_BW_LATENCY"] = str(args.latency)
+
+        for name in args.scenarios:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "-child", json.dumps([db_path, SCENARIOS[name]])],
+                env=env, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            results[name] = result
+
+            phases = "  ".join(f"{method}={seconds:.2f}s" for method, seconds in result["phases_s"].items())
+            print(f"{name:12} {result['entries_per_s']:9.1f} entries/s  peak {result['peak_rss_mb']:7.1f} MB  {phases}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"config": config, "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print("!! baseline was recorded with a different configuration, figures are not comparable")
+        _compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Synthetic KeePass databases for benchmarks.
+
+    python benchmarks/synthetic.py out.kdbx -entries 20000 -depth 3 -width 4 \\
+        -ref_ratio 0.05 -fields 10 -attachment_ratio 0.1 -attachment_size 65536
+
+The password of generated databases is ``benchmark``.
+"""
+import os
+import random
+from argparse import ArgumentParser
+
+from lxml.builder import E
+from pykeepass import create_database
+from pykeepass.entry import Entry
+
+PASSWORD = "benchmark"
+
+
+def _build_groups(kp, parent, depth, width, prefix=""):
+    groups = []
+    if depth <= 0:
+        return groups
+    for i in range(width):
+        group = kp.add_group(parent, f"{prefix}Folder {i}")
+        groups.append(group)
+        groups += _build_groups(kp, group, depth - 1, width, f"{prefix}{i}.")
+    return groups
+
+
+def build_database(path, entries=1000, depth=2, width=3, ref_ratio=0.05, fields=5, protected_ratio=0.3,
+        attachment_ratio=0.1, attachment_size=4096, shared_binaries=0, tags=4, seed=1):
+    """Create a KDBX file at *path* and return the PyKeePass object.
+
+    Entries are spread round robin over a tree of ``width`` groups per level
+    and ``depth`` levels below the root. ``ref_ratio`` of the entries are REF
+    entries pointing at a normal entry: every second one with the same
+    credentials (its URL is merged), the others with an own password.
+    ``shared_binaries`` > 0 limits the attachments to that many distinct
+    binaries, which are then attached to many entries.
+    """
+    rnd = random.Random(seed)
+    kp = create_database(path, password=PASSWORD)
+    groups = [kp.root_group] + _build_groups(kp, kp.root_group, depth, width)
+
+    binary_ids = []
+    if shared_binaries:
+        binary_ids = [kp.add_binary(rnd.randbytes(attachment_size)) for _ in range(shared_binaries)]
+
+    normal = []
+    for i in range(entries):
+        group = groups[i % len(groups)]
+        tag = [f"team-{i % tags}"] if tags else None
+
+        if normal and rnd.random() < ref_ratio:
+            target = rnd.choice(normal)
+            username = f"{{REF:U@I:{target.uuid.hex.upper()}}}"
+            password = f"{{REF:P@I:{target.uuid.hex.upper()}}}" if i % 2 else f"own password {i}"
+            entry = Entry(f"ref entry {i}", username, password, url=f"https://ref{i}.example.com", tags=tag, kp=kp)
+            group._element.append(entry._element)
+            continue
+
+        entry = Entry(f"entry {i}", f"user{i}", f"password {i}", url=f"https://site{i}.example.com",
+            notes=f"notes of entry {i}", tags=tag, kp=kp)
+        for f in range(fields):
+            protected = "True" if rnd.random() < protected_ratio else "False"
+            entry._element.append(E.String(E.Key(f"field {f}"), E.Value(f"value {f} of {i}", Protected=protected)))
+
+        if attachment_ratio and rnd.random() < attachment_ratio:
+            if binary_ids:
+                binary_id = rnd.choice(binary_ids)
+            else:
+                binary_id = kp.add_binary(rnd.randbytes(attachment_size))
+            entry._element.append(E.Binary(E.Key(f"file{i}.bin"), E.Value(Ref=str(binary_id))))
+
+        group._element.append(entry._element)
+        normal.append(entry)
+
+    kp.save()
+    return kp
+
+
+def main():
+    parser = ArgumentParser(description="Generate a synthetic KeePass db for benchmarks")
+    parser.add_argument('path', help='Output kdbx file')
+    parser.add_argument('-entries', dest='entries', default=1000, type=int)
+    parser.add_argument('-depth', dest='depth', default=2, type=int, help='Folder levels below the root')
+    parser.add_argument('-width', dest='width', default=3, type=int, help='Subfolders per folder')
+    parser.add_argument('-ref_ratio', dest='ref_ratio', default=0.05, type=float)
+    parser.add_argument('-fields', dest='fields', default=5, type=int, help='Custom fields per entry')
+    parser.add_argument('-attachment_ratio', dest='attachment_ratio', default=0.1, type=float)
+    parser.add_argument('-attachment_size', dest='attachment_size', default=4096, type=int)
+    parser.add_argument('-shared_binaries', dest='shared_binaries', default=0, type=int)
+    parser.add_argument('-seed', dest='seed', default=1, type=int)
+    args = parser.parse_args()
+
+    build_database(args.path, entries=args.entries, depth=args.depth, width=args.width, ref_ratio=args.ref_ratio,
+        fields=args.fields, attachment_ratio=args.attachment_ratio, attachment_size=args.attachment_size,
+        shared_binaries=args.shared_binaries, seed=args.seed)
+    print(f"Wrote {args.entries} entries to {os.path.abspath(args.path)} (password: {PASSWORD})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import base64
+import hashlib
+import threading
+import zlib
+
+
+class BinaryPool():
+    """Reads single binaries from the shared binary pool of a KeePass db.
+
+    pykeepass' ``Attachment.data`` goes through ``PyKeePass.binaries``, which
+    copies (and for KDBX 3 decompresses) every binary in the db on each access.
+    Here only the requested binary is read, and its sha256 and size are cached
+    by pool index, so a binary attached to many entries is hashed once.
+    """
+
+    def __init__(self, kp):
+        self._kp = kp
+        self._digests = {}
+        self._lock = threading.Lock()
+
+        if kp.version >= (4, 0):
+            self._elements = None
+        else:
+            self._elements = {int(elem.attrib['ID']): elem for elem in kp._xpath('/KeePassFile/Meta/Binaries/Binary')}
+
+    def read(self, binary_id):
+        if self._elements is None:
+            # first byte is a prepended flag
+            return self._kp.payload.inner_header.binary[binary_id].data[1:]
+
+        elem = self._elements[binary_id]
+        if elem.text is None:
+            return b''
+        if elem.get('Compressed') == 'True':
+            return zlib.decompress(base64.b64decode(elem.text), zlib.MAX_WBITS | 32)
+        return base64.b64decode(elem.text)
+
+    def digest(self, binary_id):
+        """Return (sha256, size) of a binary, computed on first use only."""
+        with self._lock:
+            if binary_id in self._digests:
+                return self._digests[binary_id]
+
+        data = self.read(binary_id)
+        result = (hashlib.sha256(data).hexdigest(), len(data))
+
+        with self._lock:
+            self._digests[binary_id] = result
+        return result
+
+    def attachment(self, filename, binary_id):
+        return BinaryAttachment(filename, binary_id, self)
+
+
+class BinaryAttachment():
+    """A KeePass attachment referencing a binary in the pool by index."""
+    __slots__ = ("filename", "binary_id", "_pool")
+
+    def __init__(self, filename, binary_id, pool):
+        self.filename = filename
+        self.binary_id = binary_id
+        self._pool = pool
+
+    @property
+    def data(self):
+        return self._pool.read(self.binary_id)
+
+    def digest(self):
+        return self._pool.digest(self.binary_id)
+
+
+class FieldAttachment():
+    """A string field of a KeePass entry that is too long for a Bitwarden
+    item and is uploaded as a text file instead. Only the entry element and
+    the field key are kept, the value is read when it is uploaded or hashed."""
+    __slots__ = ("filename", "key", "_element", "_digest")
+
+    def __init__(self, filename, key, element):
+        self.filename = filename
+        self.key = key
+        self._element = element
+        self._digest = None
+
+    @property
+    def data(self):
+        for string in self._element.iterchildren("String"):
+            if string.findtext("Key") == self.key:
+                return (string.findtext("Value") or "").encode("UTF-8")
+        return b''
+
+    def digest(self):
+        if self._digest is None:
+            data = self.data
+            self._digest = (hashlib.sha256(data).hexdigest(), len(data))
+        return self._digest
+
+
+class UploadCache():
+    """Attachments known to be present on Bitwarden items, keyed by
+    (item_id, sha256) and the attachment's file name. Lets re-runs skip
+    uploads of attachments that are already there."""
+
+    def __init__(self, uploads=None):
+        # item_id -> {sha256: {filename: attachment_id}}
+        self._uploads = uploads if uploads else {}
+        self._lock = threading.Lock()
+
+    def contains(self, item_id, sha256, filename):
+        return filename in self._uploads.get(item_id, {}).get(sha256, {})
+
+    def record(self, item_id, sha256, filename, attachment_id):
+        with self._lock:
+            self._uploads.setdefault(item_id, {}).setdefault(sha256, {})[filename] = attachment_id
+
+    def key_of(self, item_id, attachment_id):
+        """Return the (sha256, filename) of an uploaded attachment, or None."""
+        for sha256, files in self._uploads.get(item_id, {}).items():
+            for filename, known_id in files.items():
+                if known_id == attachment_id:
+                    return sha256, filename
+        return None
+
+    def forget(self, item_id, attachment_id):
+        with self._lock:
+            key = self.key_of(item_id, attachment_id)
+            if key:
+                sha256, filename = key
+                del self._uploads[item_id][sha256][filename]
+
+    def to_dict(self):
+        with self._lock:
+            return {item_id: {sha256: dict(files) for sha256, files in hashes.items() if files}
+                for item_id, hashes in self._uploads.items()}
@@ -1,61 +1,267 @@
+import io
 import json
 import logging
 import os
 import shutil
 import subprocess
 import tempfile
-from itertools import groupby
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .bwserve import BitwardenServe
+from .itemindex import ItemIndex
+from .jsonstream import iter_json_array
+from .scheduler import RequestScheduler
+from .stats import RunStats
+
+
+def _write_temporary_file(directory, filename, data):
+    """Write ``data`` to ``filename`` in a new directory below ``directory``,
+    so concurrent uploads may share a filename, and return its path."""
+    temp_dir = tempfile.mkdtemp(dir=directory)
+    path = os.path.join(temp_dir, filename)
+    try:
+        with open(path, "wb") as f:
+            f.write(data)
+    except OSError:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    return path
+
+
+def _memory_backed_temp_root():
+    """Return a RAM-backed directory for temporary files if the system has
+    one (tmpfs on /dev/shm), otherwise None for the default temp dir."""
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return None
 
 
 class BitwardenClient():
 
-    def __init__(self, password, orgId):
+    def __init__(self, password, orgId, serve=False, stats=None, journal=None, scheduler=None, snapshot=None):
+        self._serve = None
+        self._stats = stats
+        self._journal = journal
+        self._snapshot = snapshot
+        self._account = None
+        self._scheduler = scheduler if scheduler else RequestScheduler(stats=stats)
+
+        # folders and collections are created by at most one worker at a time
+        self._lock = threading.Lock()
+        self._temp_lock = threading.Lock()
+        self._coll_template = None
+
         # check for bw cli installation
-        if not "bitwarden" in self._exec(["bw", "--version"]):
+        ok, output = self._exec_result(["bw", "--version"])
+        if not ok:
             raise Exception("Bitwarden Cli not installed! See https://help.bitwarden.com/article/cli/#download--install for help")
 
         # save org
         self._orgId = orgId
 
         # login
-        self._key = self._exec(["bw", "unlock", "--raw"], stdin_data=password.encode("utf-8"), redact_log=True)
-        if "error" in self._key.lower() or "invalid" in self._key.lower():
+        ok, self._key = self._exec_result(["bw", "unlock", "--raw"], stdin_data=password.encode("utf-8"))
+        if not ok or not self._key:
             raise Exception("Could not unlock the Bitwarden db. Is the Master Password correct and are bw cli tools set up correctly?")
 
+        # route all further calls through one long running bw serve process
+        if serve:
+            self._serve = BitwardenServe(self._key, timeout=self._scheduler.timeout)
+            self._serve.start()
+
+        try:
+            self._load_vault_state()
+        except Exception:
+            if self._serve:
+                self._serve.stop()
+            raise
+
+    def _load_vault_state(self):
         # make sure data is up to date
-        if not "Syncing complete." in self._exec(["bw", "sync", "--session", self._key]):
+        ok, output = self._exec_result(["bw", "sync", "--session", self._key])
+        if not ok:
             raise Exception("Could not sync the local state to your Bitwarden server")
 
+        # an interrupted import continues from the vault state in its journal
+        if self._journal and self._journal.resuming:
+            self._load_journaled_vault_state()
+            return
+
         # get folder list
-        self._folders = {folder["name"]: folder["id"] for folder in json.loads(self._exec(["bw", "list", "folders", "--session", self._key]))}
+        self._folders = self._list_folders()
 
-        # get existing entries
-        self._folder_entries = self._get_existing_folder_entries()
+        # get existing entries, from the snapshot of an earlier run if it is still valid
+        vault = self._load_snapshot() if self._snapshot else None
+        if vault:
+            self._items = ItemIndex.from_records(vault["items"])
+            self._org_colls = dict(vault["colls"])
+        else:
+            self._items = self._get_existing_item_index()
+            self._org_colls = {}
 
         # get existing collections
-        if orgId:
-            self._colls = {coll["name"]: coll["id"] for coll in json.loads(self._exec(["bw", "list", "org-collections", "--organizationid", orgId, "--session", self._key]))}
-        else:
-            self._colls = None
+        if self._orgId and self._orgId not in self._org_colls:
+            self._org_colls[self._orgId] = self._list_org_collections(self._orgId)
+        self._colls = self._org_colls.get(self._orgId)
+
+        if self._journal:
+            # only what resuming needs, usernames and URIs stay off the disk
+            self._journal.start({
+                "folders": dict(self._folders),
+                "items": [[folder, name, item_id] for folder, name, item_id, username, uri, created, org in self._items.to_records()
+                    if org == self._orgId],
+                "colls": dict(self._colls) if self._colls is not None else None,
+            })
+
+    def _load_snapshot(self):
+        status = json.loads(self._exec(["bw", "status", "--session", self._key]))
+        self._account = [status.get("serverUrl"), status.get("userId")]
+
+        vault = self._snapshot.load(self._account)
+        if vault is None:
+            return None
+
+        # folders are listed anyway and cheap to compare, a difference means
+        # the vault was changed by someone else
+        if vault["folders"] != self._folders:
+            logging.info(f"The folders of the vault changed since the snapshot was saved, listing the vault instead")
+            return None
+
+        logging.info(f"Using the vault snapshot of {len(vault['items'])} items instead of listing the vault")
+        return vault
+
+    def _save_snapshot(self):
+        # the items created in this run exist for the next one
+        self._items.settle_created()
+        self._snapshot.save(self._account, {
+            "folders": dict(self._folders),
+            "items": self._items.to_records(),
+            "colls": {orgId: colls for orgId, colls in self._org_colls.items() if orgId},
+        })
+
+    def _load_journaled_vault_state(self):
+        vault = self._journal.vault
+        self._folders = dict(vault["folders"])
+        self._items = ItemIndex()
+        for record in vault["items"]:
+            folder, name, item_id = record[:3]
+            self._items.add(folder, name, item_id, org=self._orgId)
+        for record in self._journal.items.values():
+            self._items.add(record["folder"], record["name"], record["id"], created=True, org=self._orgId)
+        self._colls = dict(vault["colls"]) if vault.get("colls") is not None else None
+        self._org_colls = {self._orgId: self._colls}
+
+        if self._orgId and self._colls is None:
+            raise Exception("The journal was written by an import into the personal vault, it can not be resumed with -bworg")
+
+    def _list_org_collections(self, orgId):
+        return {coll["name"]: coll["id"] for coll in json.loads(self._exec(["bw", "list", "org-collections", "--organizationid", orgId, "--session", self._key]))}
+
+    def use_organization(self, orgId):
+        """Switch to another organization (or the personal vault, for None)
+        between the jobs of a manifest run. The session, folders and items
+        are kept, the collections of each organization are listed once."""
+        with self._lock:
+            if orgId not in self._org_colls:
+                self._org_colls[orgId] = self._list_org_collections(orgId) if orgId else None
+            self._orgId = orgId
+            self._colls = self._org_colls[orgId]
+            self._items.settle_created()
 
     def __enter__(self):
-        self._temp_dir = tempfile.mkdtemp(prefix="kp2bw-")
+        temp_root = _memory_backed_temp_root()
+        self._temp_in_memory = temp_root is not None
+        self._temp_warned = self._temp_in_memory
+        self._temp_dir = tempfile.mkdtemp(prefix="kp2bw-", dir=temp_root)
+        self._temp_dirs = [self._temp_dir]
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self._remove_temporary_attachment_folder()
+        if self._serve:
+            self._serve.stop()
+        if self._snapshot and self._account:
+            self._save_snapshot()
 
     def _create_temporary_attachment_folder(self):
-        if not os.path.isdir(self._temp_dir):
-            os.mkdir(self._temp_dir)
+        with self._temp_lock:
+            if not self._temp_warned:
+                # warn once, the first time plain data is about to hit the disk
+                self._temp_warned = True
+                logging.warning(f"!! No RAM-backed directory found, temporary files are written unencrypted to {self._temp_dir} until uploaded; use -bwserve to upload attachments from memory !!")
+            if not os.path.isdir(self._temp_dir):
+                os.mkdir(self._temp_dir)
 
     def _remove_temporary_attachment_folder(self):
-        if os.path.isdir(self._temp_dir):
-            shutil.rmtree(self._temp_dir)
+        for temp_dir in self._temp_dirs:
+            if os.path.isdir(temp_dir):
+                shutil.rmtree(temp_dir)
+
+    def _move_temporary_files_to_disk(self, error):
+        with self._temp_lock:
+            if not self._temp_in_memory:
+                return
+            self._temp_in_memory = False
+            self._temp_warned = True
+            self._temp_dir = tempfile.mkdtemp(prefix="kp2bw-")
+            self._temp_dirs.append(self._temp_dir)
+            logging.warning(f"!! The RAM-backed directory is full ({error}), temporary files are written unencrypted to {self._temp_dir} until uploaded; use -bwserve to upload attachments from memory !!")
+
+    def _write_temporary_file(self, filename, data):
+        """Write a file for bw to read and return its path. A RAM-backed
+        directory can be small, /dev/shm of a Docker container holds 64 MB,
+        once it is full the files go to the default temp dir instead."""
+        self._create_temporary_attachment_folder()
+        in_memory = self._temp_in_memory
+        try:
+            return _write_temporary_file(self._temp_dir, filename, data)
+        except OSError as e:
+            if not in_memory:
+                raise
+            self._move_temporary_files_to_disk(e.strerror or e)
+            return _write_temporary_file(self._temp_dir, filename, data)
+
+    def _exec(self, args, stdin_data=None):
+        """Run a command and return its output, raise if it failed."""
+        ok, output = self._exec_result(args, stdin_data)
+        if not ok:
+            raise Exception(f"bw {RunStats.command_type(args)} failed: {output}")
+        return output
+
+    def _exec_result(self, args, stdin_data=None):
+        """Run a command with list-form args (avoiding shell). Return (ok,
+        output): stdout on success, stderr or the exception text on failure.
+        Commands supported by ``bw serve`` go over http when it is running.
+        Transient failures are retried by the RequestScheduler."""
+        command = RunStats.command_type(args)
+        return self._scheduler.run(command, lambda: self._exec_attempt(args, stdin_data, command))
+
+    def _exec_attempt(self, args, stdin_data, command):
+        if not self._stats:
+            return self._exec_command(args, stdin_data)
+
+        bytes_sent = len(stdin_data) if stdin_data else 0
+        if stdin_data is None and "--file" in args:
+            bytes_sent = os.path.getsize(args[args.index("--file") + 1])
+        elif args[1:2] == ["import"]:
+            bytes_sent = os.path.getsize(args[3])
+
+        start = time.perf_counter()
+        try:
+            return self._exec_command(args, stdin_data)
+        finally:
+            self._stats.record_call(command, time.perf_counter() - start, bytes_sent)
+
+    def _exec_command(self, args, stdin_data=None):
+        """Run one attempt of a command, return (ok, output)."""
+        if self._serve:
+            output = self._serve.exec(args, stdin_data)
+            if output is not None:
+                return not output.startswith("error: "), output
 
-    def _exec(self, args, stdin_data=None, redact_log=False):
-        """Run a command with list-form args (avoiding shell). Return stdout on
-        success, stderr on failure, or the exception text as a fallback."""
         log_safe = ' '.join(args)
         if hasattr(self, '_key') and self._key:
             log_safe = log_safe.replace(self._key, "***REDACTED***")
@@ -66,30 +272,93 @@ class BitwardenClient():
                 args,
                 input=stdin_data,
                 capture_output=True,
-                timeout=120,
+                timeout=self._scheduler.timeout,
             )
-            output = proc.stdout if proc.returncode == 0 else proc.stderr
+            ok = proc.returncode == 0
+            output = proc.stdout if ok else proc.stderr
         except subprocess.TimeoutExpired as e:
+            ok = False
             output = e.stderr or b"Timeout expired"
         except Exception as e:
-            return str(e)
+            return False, str(e)
 
         result = output.decode("utf-8", "ignore") if isinstance(output, bytes) else str(output)
         logging.debug(f"  |- Output: {result[:500]}")
+        return ok, result
+
+    def _list_folders(self):
+        return {folder["name"]: folder["id"] for folder in json.loads(self._exec(["bw", "list", "folders", "--session", self._key]))}
+
+    def _exec_json_stream(self, args, consume):
+        """Run a command that prints a JSON array and return ``consume`` of
+        an iterator over its elements. The elements are parsed while bw
+        still prints them, the output is never read as one string. Retried
+        like _exec."""
+        command = RunStats.command_type(args)
+
+        def attempt():
+            start = time.perf_counter()
+            try:
+                return self._stream_command(args, consume)
+            finally:
+                if self._stats:
+                    self._stats.record_call(command, time.perf_counter() - start)
+
+        ok, result = self._scheduler.run(command, attempt)
+        if not ok:
+            raise Exception(f"bw {command} failed: {result}")
         return result
 
-    def _get_existing_folder_entries(self):
+    def _stream_command(self, args, consume):
+        """Run one attempt of _exec_json_stream, return (ok, result or error)."""
+        if self._serve:
+            ok, output = self._exec_command(args)
+            return (True, consume(iter(json.loads(output)))) if ok else (False, output)
+
+        logging.debug(f"-- Executing command: {' '.join(args).replace(self._key, '***REDACTED***')}")
+        try:
+            proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except Exception as e:
+            return False, str(e)
+
+        timer = threading.Timer(self._scheduler.timeout, proc.kill)
+        timer.start()
+
+        # stderr is drained while stdout is read, bw blocks once it filled the pipe
+        stderr = []
+        reader = threading.Thread(target=lambda: stderr.append(proc.stderr.read()), daemon=True)
+        reader.start()
+
+        parse_error = None
+        try:
+            with proc:
+                try:
+                    result = consume(iter_json_array(io.TextIOWrapper(proc.stdout, encoding="utf-8", errors="ignore")))
+                except ValueError as e:
+                    proc.kill()
+                    parse_error = f"Could not parse the output: {e}"
+                finally:
+                    reader.join()
+        finally:
+            timer.cancel()
+
+        error = b"".join(stderr).decode("utf-8", "ignore")
+        if parse_error:
+            return False, error or parse_error
+        if proc.returncode != 0:
+            return False, error or f"Exited with code {proc.returncode}"
+        return True, result
+
+    def _get_existing_item_index(self):
         folder_id_lookup_helper = {folder_id: folder_name for folder_name,folder_id in self._folders.items()}
-        items = json.loads(self._exec(["bw", "list", "items", "--session", self._key]))
 
-        # fix None folderIds for entries without folders
-        for item in items:
-            if not item['folderId']:
-                item['folderId'] = ''
+        # index the items while they are listed
+        return self._exec_json_stream(["bw", "list", "items", "--session", self._key],
+            lambda items: ItemIndex.from_items(items, folder_id_lookup_helper))
 
-        items.sort(key=lambda item: item["folderId"])
-        return {folder_id_lookup_helper[folder_id] if folder_id in folder_id_lookup_helper else None: [entry["name"] for entry in entries]
-            for folder_id, entries in groupby(items, key=lambda item: item["folderId"])}
+    @property
+    def items(self):
+        return self._items
 
     def has_folder(self, folder):
         return folder in self._folders
@@ -98,6 +367,25 @@ class BitwardenClient():
         if not folder or self.has_folder(folder):
             return
 
+        with self._lock:
+            if self.has_folder(folder):
+                return
+            self._create_folder(folder)
+
+    def create_folders(self, folders, jobs=1):
+        """Create the missing ones of a set of folders up front, ``jobs`` at a
+        time, so that the item loop only has to look up their ids."""
+        missing = sorted({folder for folder in folders if folder and not self.has_folder(folder)})
+        if not missing:
+            return
+
+        logging.info(f"Creating {len(missing)} folders")
+        with self._lock, ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            for _ in executor.map(self._create_folder, missing):
+                pass
+
+    def _create_folder(self, folder):
+
         data = {"name": folder}
         json_bytes = json.dumps(data).encode("utf-8")
 
@@ -106,12 +394,21 @@ class BitwardenClient():
         output_obj = json.loads(output)
 
         self._folders[output_obj["name"]] = output_obj["id"]
+        if self._journal:
+            self._journal.folder(output_obj["name"], output_obj["id"])
+
+    def has_entry(self, folder, name):
+        # items created in this run do not count, see ItemIndex
+        return self._items.contains(folder, name, include_created=False, org=self._orgId)
 
     def create_entry(self, folder, entry):
+        """Create an item, return (ok, output). output is the created item as
+        JSON, bw's error if the call failed, or None if an item with this
+        folder and name already existed and nothing was created."""
         # check if already exists
-        if folder in self._folder_entries and entry["name"] in self._folder_entries[folder]:
+        if self.has_entry(folder, entry["name"]):
             logging.info(f"-- Entry {entry['name']} already exists in folder {folder}. skipping...")
-            return "skip"
+            return True, None
 
         # create folder if exists
         if folder:
@@ -122,9 +419,104 @@ class BitwardenClient():
 
         json_bytes = json.dumps(entry).encode("utf-8")
 
-        output = self._exec(["bw", "create", "item", "--session", self._key], stdin_data=json_bytes)
+        ok, output = self._exec_result(["bw", "create", "item", "--session", self._key], stdin_data=json_bytes)
+        if ok:
+            self._items.add_item(folder, json.loads(output), created=True)
 
-        return output
+        return ok, output
+
+    def edit_entry(self, item_id, folder, entry):
+        """Replace the content of an existing item, used by incremental syncs
+        for entries that changed in KeePass. Returns (ok, output)."""
+        if folder:
+            self.create_folder(folder)
+            entry["folderId"] = self._folders[folder]
+
+        json_bytes = json.dumps(entry).encode("utf-8")
+
+        return self._exec_result(["bw", "edit", "item", item_id, "--session", self._key], stdin_data=json_bytes)
+
+    def delete_attachment(self, item_id, attachment_id):
+        return self._exec_result(["bw", "delete", "attachment", attachment_id, "--itemid", item_id, "--session", self._key])
+
+    def import_entries(self, entries):
+        """Import a chunk of (folder, entry) pairs into the personal vault with
+        a single ``bw import``.
+
+        Entries that already exist are skipped, like in ``create_entry``. After
+        the import the vault is synced and the folders of the chunk are
+        listed, and a list with the id of the newly created item for each
+        given entry (None where it was skipped) is returned, so attachments
+        can be uploaded afterwards. Imported items are told apart by folder
+        and name only, so those must be unique within a chunk. Returns None
+        if the import failed.
+        """
+        folders = {}
+        items = []
+        keys = []
+        for folder, entry in entries:
+            if self.has_entry(folder, entry["name"]):
+                logging.info(f"-- Entry {entry['name']} already exists in folder {folder}. skipping...")
+                keys.append(None)
+                continue
+
+            if (folder, entry["name"]) in keys:
+                raise Exception(f"The entry {entry['name']} is in folder {folder} twice, it can not be imported in one chunk")
+
+            item = dict(entry)
+            if folder:
+                if folder not in folders:
+                    folders[folder] = self._folders.get(folder) or str(uuid.uuid4())
+                item["folderId"] = folders[folder]
+
+            items.append(item)
+            keys.append((folder, item["name"]))
+
+        if not items:
+            return keys
+
+        data = {
+            "encrypted": False,
+            "folders": [{"id": folder_id, "name": folder} for folder, folder_id in folders.items()],
+            "items": items,
+        }
+
+        path_to_file_on_disk = self._write_temporary_file("import.json", json.dumps(data).encode("utf-8"))
+
+        try:
+            ok, output = self._exec_result(["bw", "import", "bitwardenjson", path_to_file_on_disk, "--session", self._key])
+        finally:
+            shutil.rmtree(os.path.dirname(path_to_file_on_disk))
+
+        if not ok:
+            logging.error(f"!! ERROR: Import of {len(items)} entries failed: {output} !!")
+            return None
+
+        # learn the ids of the imported items, listing only the folders of the chunk
+        with self._lock:
+            self._exec(["bw", "sync", "--session", self._key])
+            known_folders = self._folders
+            self._folders = self._list_folders()
+            if self._journal:
+                for folder, folder_id in self._folders.items():
+                    if folder not in known_folders:
+                        self._journal.folder(folder, folder_id)
+            folder_id_lookup_helper = {folder_id: folder_name for folder_name,folder_id in self._folders.items()}
+
+            created = {}
+            for folder in {folder for folder, name in filter(None, keys)}:
+                folder_id = self._folders.get(folder) if folder else "null"
+                if not folder_id:
+                    continue
+
+                for item in self._exec_json_stream(["bw", "list", "items", "--folderid", folder_id, "--session", self._key], list):
+                    if self._items.has_id(item["id"]):
+                        continue
+                    item_folder = folder_id_lookup_helper.get(item.get("folderId"))
+                    self._items.add_item(item_folder, item, created=True)
+                    created[(item_folder, item["name"])] = item["id"]
+
+        return [created.get(key) if key else None for key in keys]
 
     def _validate_attachment_filename(self, filename: str) -> str:
         """Validate and sanitize attachment filename using os.path.basename."""
@@ -136,43 +528,67 @@ class BitwardenClient():
         return safe_name
 
     def create_attachment(self, item_id, attachment):
-        # store attachment on disk
-        filename = ""
-        data = None
-        if isinstance(attachment, tuple):
-            # long custom property
-            key, value = attachment
-            filename = self._validate_attachment_filename(key + ".txt")
-            data = value.encode("UTF-8")
-        else:
-            # real kp attachment
-            filename = self._validate_attachment_filename(attachment.filename)
-            data = attachment.data
+        """Upload an attachment to an item, return (ok, output)."""
+        # kp attachment or long field, read only now
+        filename = self._validate_attachment_filename(attachment.filename)
+        data = attachment.data
 
-        # make sure temporary attachment folder exists
-        self._create_temporary_attachment_folder()
+        # bw serve takes the content in the request, nothing touches the disk
+        if self._serve:
+            return self._exec_result(["bw", "create", "attachment", "--file", filename, "--itemid", item_id, "--session", self._key], stdin_data=data)
 
-        path_to_file_on_disk = os.path.join(self._temp_dir, filename)
-        with open(path_to_file_on_disk, "wb") as f:
-            f.write(data)
+        try:
+            path_to_file_on_disk = self._write_temporary_file(filename, data)
+        except OSError as e:
+            return False, f"Could not write the temporary file: {e}"
 
         try:
-            output = self._exec(["bw", "create", "attachment", "--file", path_to_file_on_disk, "--itemid", item_id, "--session", self._key])
+            return self._exec_result(["bw", "create", "attachment", "--file", path_to_file_on_disk, "--itemid", item_id, "--session", self._key])
         finally:
-            os.remove(path_to_file_on_disk)
+            shutil.rmtree(os.path.dirname(path_to_file_on_disk))
 
-        return output
+    def has_collection(self, collectionname):
+        return self._colls is not None and collectionname in self._colls
+
+    def create_org_collections(self, collectionnames, jobs=1):
+        """Create the missing ones of a set of collections up front, ``jobs``
+        at a time."""
+        missing = sorted({name for name in collectionnames if name and not self.has_collection(name)})
+        if not missing:
+            return
+
+        logging.info(f"Creating {len(missing)} collections")
+        with self._lock:
+            self._get_org_collection_template()
+        with self._lock, ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            for _ in executor.map(self._create_org_collection, missing):
+                pass
 
     def create_org_get_collection(self, collectionname):
 
         if not collectionname: return None
 
+        if self.has_collection(collectionname):
+            return self._colls[collectionname]
+
+        with self._lock:
+            return self._create_org_get_collection(collectionname)
+
+    def _create_org_get_collection(self, collectionname):
         # check for existing
         if self._colls.get(collectionname):
             return self._colls.get(collectionname)
 
-        # get template
-        entry = json.loads(self._exec(["bw", "get", "template", "org-collection", "--session", self._key]))
+        return self._create_org_collection(collectionname)
+
+    def _get_org_collection_template(self):
+        # the template is the same for every collection, fetch it once
+        if self._coll_template is None:
+            self._coll_template = json.loads(self._exec(["bw", "get", "template", "org-collection", "--session", self._key]))
+        return dict(self._coll_template)
+
+    def _create_org_collection(self, collectionname):
+        entry = self._get_org_collection_template()
 
         # set org and Name
         entry['name'] = collectionname
@@ -188,5 +604,7 @@ class BitwardenClient():
 
         #store in cache
         self._colls[collectionname] = newCollId
+        if self._journal:
+            self._journal.collection(collectionname, newCollId)
 
         return newCollId
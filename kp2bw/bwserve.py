@@ -0,0 +1,218 @@
+import json
+import logging
+import os
+import queue
+import socket
+import subprocess
+import time
+import uuid
+from http.client import HTTPConnection, HTTPException, RemoteDisconnected
+from urllib.parse import quote, urlencode
+
+
+class BitwardenServe():
+    """Runs ``bw serve`` on a local port and talks to its REST API over
+    pooled keep-alive HTTP connections (one per concurrent caller).
+
+    ``exec`` takes the same argument lists as ``BitwardenClient._exec`` and
+    returns the output the CLI would have printed, so the client can route a
+    command here or fall back to a subprocess without the caller noticing.
+    """
+
+    def __init__(self, session_key, hostname="127.0.0.1", port=None, startup_timeout=30, timeout=120):
+        self._session_key = session_key
+        self._timeout = timeout
+        self._hostname = hostname
+        self._port = port if port else self._find_free_port(hostname)
+        self._startup_timeout = startup_timeout
+        self._proc = None
+        self._pool = queue.LifoQueue()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @staticmethod
+    def _find_free_port(hostname):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind((hostname, 0))
+            return s.getsockname()[1]
+
+    def start(self):
+        env = dict(os.environ)
+        env["BW_SESSION"] = self._session_key
+
+        logging.debug(f"-- Starting bw serve on {self._hostname}:{self._port}")
+        self._proc = subprocess.Popen(
+            ["bw", "serve", "--hostname", self._hostname, "--port", str(self._port)],
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+        # wait until the api answers
+        deadline = time.monotonic() + self._startup_timeout
+        while time.monotonic() < deadline:
+            if self._proc.poll() is not None:
+                raise Exception(f"bw serve exited with code {self._proc.returncode} during startup")
+            try:
+                status, _ = self._request("GET", "/status")
+                if status == 200:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.2)
+
+        self.stop()
+        raise Exception(f"bw serve did not answer on {self._hostname}:{self._port} within {self._startup_timeout}s")
+
+    def stop(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+        if self._proc and self._proc.poll() is None:
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+        self._proc = None
+
+    def _acquire_connection(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return HTTPConnection(self._hostname, self._port, timeout=self._timeout)
+
+    def _request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if body is not None and "Content-Type" not in headers:
+            headers["Content-Type"] = "application/json"
+
+        # the server drops idle keep-alive connections, so reconnect once
+        for attempt in range(2):
+            conn = self._acquire_connection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                result = response.status, response.read()
+            except (RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            except (HTTPException, OSError):
+                conn.close()
+                raise
+
+            self._pool.put(conn)
+            return result
+
+    @staticmethod
+    def _split_args(args):
+        """Split a bw argument list into positionals and ``--option value``
+        pairs. The session option is dropped, the server already holds it."""
+        positionals = []
+        options = {}
+        rest = iter(args[1:])
+        for arg in rest:
+            if arg.startswith("--"):
+                options[arg[2:]] = next(rest, None)
+            else:
+                positionals.append(arg)
+        options.pop("session", None)
+        options.pop("raw", None)
+        return positionals, options
+
+    @staticmethod
+    def _multipart(field, filename, data):
+        boundary = uuid.uuid4().hex
+        # the name as a quoted-string, plus its RFC 5987 form, which the
+        # server prefers, so non-ASCII names arrive intact
+        escaped = filename.replace("\\", "\\\\").replace('"', '\\"')
+        head = (
+            f"--{boundary}\r\n"
+            f"Content-Disposition: form-data; name=\"{field}\"; filename=\"{escaped}\"; filename*=UTF-8''{quote(filename, safe='')}\r\n"
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode("utf-8")
+        tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+        return head + data + tail, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+    def _route(self, args, stdin_data):
+        """Map a bw argument list to (method, path, body, headers, kind) or
+        None if the command has no ``bw serve`` equivalent."""
+        positionals, options = self._split_args(args)
+        if not positionals:
+            return None
+
+        command = positionals[0]
+        if command == "sync" and len(positionals) == 1:
+            return "POST", "/sync", None, None, "sync"
+
+        if command == "list" and len(positionals) == 2:
+            query = f"?{urlencode(options)}" if options else ""
+            return "GET", f"/list/object/{positionals[1]}{query}", None, None, "data"
+
+        if command == "get" and len(positionals) == 3 and positionals[1] == "template":
+            return "GET", f"/object/template/{positionals[2]}", None, None, "template"
+
+        if command == "create" and len(positionals) == 2:
+            if positionals[1] == "attachment":
+                # the content can be passed in memory, then --file only names it
+                path = options.pop("file")
+                if stdin_data is None:
+                    with open(path, "rb") as f:
+                        stdin_data = f.read()
+                body, headers = self._multipart("file", os.path.basename(path), stdin_data)
+                return "POST", f"/attachment?{urlencode(options)}", body, headers, "data"
+
+            query = f"?{urlencode(options)}" if options else ""
+            return "POST", f"/object/{positionals[1]}{query}", stdin_data, None, "data"
+
+        if command == "edit" and len(positionals) == 3:
+            return "PUT", f"/object/{positionals[1]}/{positionals[2]}", stdin_data, None, "data"
+
+        if command == "delete" and len(positionals) == 3:
+            query = f"?{urlencode(options)}" if options else ""
+            return "DELETE", f"/object/{positionals[1]}/{positionals[2]}{query}", None, None, "data"
+
+        return None
+
+    def exec(self, args, stdin_data=None):
+        """Run a bw command through the api. Returns None if the command is
+        not supported, so the caller can fall back to the cli."""
+        route = self._route(args, stdin_data)
+        if not route:
+            return None
+
+        method, path, body, headers, kind = route
+        logging.debug(f"-- Executing request: {method} {path.split('?')[0]}")
+        try:
+            status, raw = self._request(method, path, body, headers)
+        except Exception as e:
+            return f"error: {e}"
+
+        try:
+            response = json.loads(raw)
+        except ValueError:
+            response = {"success": False, "message": raw.decode("utf-8", "ignore")}
+
+        if status >= 400 or not response.get("success"):
+            # keep the status, it tells throttling and server errors apart
+            result = f"error: {status} {response.get('message') or ''}".rstrip()
+        elif kind == "sync":
+            result = "Syncing complete."
+        else:
+            data = response.get("data")
+            if kind == "template":
+                data = data.get("template")
+            elif isinstance(data, dict) and data.get("object") == "list":
+                data = data.get("data")
+            result = json.dumps(data)
+
+        logging.debug(f"  |- Output: {result[:500]}")
+        return result
@@ -4,6 +4,7 @@ import logging
 import sys
 from argparse import ArgumentParser
 from .convert import Converter
+from .manifest import ManifestRunner, read_manifest
 
 class MyArgParser(ArgumentParser):
     def error(self, message):
@@ -15,17 +16,49 @@ class MyArgParser(ArgumentParser):
 def _argparser():
     parser = MyArgParser(description="KeePass 2.x to Bitwarden converter by @jampe")
 
-    parser.add_argument('keepass_file', help='Path to your KeePass 2.x db.')
+    parser.add_argument('keepass_file', help='Path to your KeePass 2.x db.', nargs='?', default=None)
     parser.add_argument('-kppw', dest='kp_pw', help='KeePass db password', default=None)
     parser.add_argument('-kpkf', dest='kp_keyfile', help='KeePass db key file', default=None)
     parser.add_argument('-bwpw', dest='bw_pw', help='Bitwarden password', default=None)
     parser.add_argument('-bworg', dest='bw_org', help='Bitwarden Organization Id', default=None)
     parser.add_argument('-import_tags', dest='import_tags', help='Only import tagged items', nargs='+',default=None)
+    parser.add_argument('-import_groups', dest='import_groups', help='Only import entries in these groups and their subgroups, e.g. "Team A/Servers"', nargs='+', default=None)
+    parser.add_argument('-import_titles', dest='import_titles', help='Only import entries whose title matches one of these globs, e.g. "*prod*"', nargs='+', default=None)
     parser.add_argument('-bwcoll', dest='bw_coll', help='Id of Org-Collection, or \'auto\' to use name from toplevel-folders', default=None)
     parser.add_argument('-path2name', dest='path2name', help='Prepend folderpath of entries to each name',
                         action="store_const", const=True, default=True),
     parser.add_argument('-path2nameskip', dest='path2nameskip', help='Skip first X folders for path2name (default: 1)',
                         default=1, type=int ),
+    parser.add_argument('-bwserve', dest='bw_serve', help='Talk to Bitwarden through one long running "bw serve" process instead of one bw call per item',
+                        action="store_const", const=True, default=False)
+    parser.add_argument('-jobs', dest='jobs', help='Number of items and attachments uploaded in parallel (default: 1)',
+                        default=1, type=int)
+    parser.add_argument('-parse_workers', dest='parse_workers', help='Number of processes transforming KeePass entries into Bitwarden items (default: 1, in process)',
+                        default=1, type=int)
+    parser.add_argument('-batch', dest='batch_size', help='Import entries through "bw import" in chunks of this size instead of one by one (personal vault only)',
+                        default=0, type=int)
+    parser.add_argument('-state', dest='state_file', help='Incremental sync: only import new or changed entries and update changed items in place, tracked in this local state file',
+                        default=None)
+    parser.add_argument('-resume', dest='resume_file', help='Record progress in this journal file; if it exists, continue the interrupted import it belongs to',
+                        default=None)
+    parser.add_argument('-retries', dest='retries', help='Retries of a bw call that failed transiently, e.g. throttled or timed out (default: 5)',
+                        default=5, type=int)
+    parser.add_argument('-timeout', dest='timeout', help='Seconds a single bw call may take (default: 120)',
+                        default=120, type=int)
+    parser.add_argument('-plan', dest='plan_file', help='Only compute what the import would change and write it as JSON to this file. Reads the vault once, creates nothing',
+                        default=None)
+    parser.add_argument('-snapshot', dest='snapshot_file', help='Keep an encrypted snapshot of the vault index in this file and use it instead of listing all items on the next run',
+                        default=None)
+    parser.add_argument('-snapshot_ttl', dest='snapshot_ttl', help='Minutes a vault snapshot stays valid (default: 60)',
+                        default=60, type=int)
+    parser.add_argument('-export', dest='export_file', help='Write the entries to this Bitwarden JSON export file instead of Bitwarden, no bw CLI needed',
+                        default=None)
+    parser.add_argument('-export_pw', dest='export_pw', help='Password to encrypt the -export file with (password protected Bitwarden export)',
+                        default=None)
+    parser.add_argument('-manifest', dest='manifest_file', help='Convert the KeePass dbs listed in this JSON manifest in one Bitwarden session, instead of a single db',
+                        default=None)
+    parser.add_argument('-stats', dest='stats_file', help='Write timings per phase and per bw command, bytes sent and the slowest entries as JSON to this file',
+                        default=None)
     parser.add_argument('-y', dest='skip_confirm', help='Skips the confirm bw installation question',
                         action="store_const", const=True, default=False)
     parser.add_argument('-v', dest='verbose', help='Verbose output', action="store_const", const=True, default=False)
@@ -39,6 +72,45 @@ def _read_password(arg, prompt):
 
     return arg
 
+def _run_manifest(args):
+    jobs = read_manifest(args.manifest_file)
+
+    if args.batch_size and any(job.get("org") for job in jobs):
+        sys.stderr.write(f'ERROR: -batch can not be combined with manifest jobs that have an org\n\n')
+        _argparser().print_help()
+        sys.exit(2)
+
+    # jobs without their own password use the one of -kppw
+    kp_pw = args.kp_pw
+    if any("kppw" not in job for job in jobs):
+        kp_pw = _read_password(kp_pw, "Please enter the password of the KeePass 2.x dbs: ")
+    bw_pw = _read_password(args.bw_pw, "Please enter your Bitwarden password: ")
+
+    runner = ManifestRunner(
+        jobs,
+        bitwarden_password=bw_pw,
+        keepass_password=kp_pw,
+        bitwarden_serve=args.bw_serve,
+        retries=args.retries,
+        timeout=args.timeout,
+        stats_file_path=args.stats_file,
+        snapshot_file_path=args.snapshot_file,
+        snapshot_ttl=args.snapshot_ttl,
+        path2name=args.path2name,
+        path2nameskip=args.path2nameskip,
+        import_tags=args.import_tags,
+        import_groups=args.import_groups,
+        import_titles=args.import_titles,
+        jobs=args.jobs,
+        batch_size=args.batch_size,
+        parse_workers=args.parse_workers
+        )
+    runner.run()
+
+    print(" ")
+    print("All done.")
+
+
 def main():
     args = _argparser().parse_args()
 
@@ -47,14 +119,44 @@ def main():
         _argparser().print_help()
         sys.exit(2)
 
+    if bool(args.keepass_file) == bool(args.manifest_file):
+        sys.stderr.write(f'ERROR: give either a KeePass db or -manifest\n\n')
+        _argparser().print_help()
+        sys.exit(2)
+
+    if (args.manifest_file and (args.resume_file or args.plan_file)):
+        sys.stderr.write(f'ERROR: -manifest can not be combined with -resume or -plan\n\n')
+        _argparser().print_help()
+        sys.exit(2)
+
+    if (args.export_file and (args.manifest_file or args.plan_file or args.state_file or args.resume_file or args.batch_size or args.snapshot_file)):
+        sys.stderr.write(f'ERROR: -export can not be combined with -manifest, -plan, -state, -resume, -batch or -snapshot\n\n')
+        _argparser().print_help()
+        sys.exit(2)
+
+    if (args.export_file and args.bw_coll and args.bw_coll != 'auto'):
+        sys.stderr.write(f'ERROR: -export only supports -bwcoll auto, an export can not refer to existing collections\n\n')
+        _argparser().print_help()
+        sys.exit(2)
+
+    if (args.export_pw and not args.export_file):
+        sys.stderr.write(f'ERROR: -export_pw requires -export\n\n')
+        _argparser().print_help()
+        sys.exit(2)
+
+    if (args.batch_size and args.bw_org):
+        sys.stderr.write(f'ERROR: -batch can not be combined with -bworg\n\n')
+        _argparser().print_help()
+        sys.exit(2)
+
     # logging
     if args.verbose:
         logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.DEBUG)
     else:
         logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
 
-    # bw confirmation
-    if not args.skip_confirm:
+    # bw confirmation, an export does not use bw
+    if not args.skip_confirm and not args.export_file:
         confirm = None
         print("Do you have bw cli installed and is it set up?")
         print("1) If you use an on premise installation, use bw config to set the url: bw config server <url>")
@@ -68,9 +170,13 @@ def main():
             print("exiting...")
             sys.exit(2)
 
+    if args.manifest_file:
+        _run_manifest(args)
+        return
+
     # stdin password
     kp_pw = _read_password(args.kp_pw, "Please enter your KeePass 2.x db password: ")
-    bw_pw = _read_password(args.bw_pw, "Please enter your Bitwarden password: ")
+    bw_pw = None if args.export_file else _read_password(args.bw_pw, "Please enter your Bitwarden password: ")
 
     # call converter
     c = Converter(
@@ -82,7 +188,23 @@ def main():
         bitwarden_coll_id=args.bw_coll,
         path2name=args.path2name,
         path2nameskip=args.path2nameskip,
-        import_tags=args.import_tags
+        import_tags=args.import_tags,
+        import_groups=args.import_groups,
+        import_titles=args.import_titles,
+        bitwarden_serve=args.bw_serve,
+        jobs=args.jobs,
+        batch_size=args.batch_size,
+        state_file_path=args.state_file,
+        stats_file_path=args.stats_file,
+        parse_workers=args.parse_workers,
+        resume_file_path=args.resume_file,
+        retries=args.retries,
+        timeout=args.timeout,
+        plan_file_path=args.plan_file,
+        snapshot_file_path=args.snapshot_file,
+        snapshot_ttl=args.snapshot_ttl,
+        export_file_path=args.export_file,
+        export_password=args.export_pw
         )
     c.convert()
 
@@ -1,38 +1,100 @@
+import base64
+import hashlib
 import json
 import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from itertools import islice
 
 from enum import Enum
+from lxml import etree
 from pykeepass import PyKeePass
+from pykeepass.entry import Entry, reserved_keys
 
+from .attachments import BinaryPool, FieldAttachment, UploadCache
 from .bitwardenclient import BitwardenClient
+from .entryfilter import EntryFilter
+from .export import BitwardenExport
+from .item import ItemRecord
+from .journal import Journal
+from .plan import ImportPlan, CREATE, UPDATE, COMPLETE, SKIP, UNCHANGED
+from .references import KP_REF_PATTERN, ReferenceIndex, find_references, topological_order
+from .scheduler import RequestScheduler
+from .snapshot import VaultSnapshot
+from .stats import RunStats
+from .syncstate import SyncState
 
-KP_REF_IDENTIFIER = "{REF:"
 MAX_BW_ITEM_LENGTH = 10 * 1000
 OTP_CUSTOM_PROPERTY_KEYS = ("otp", "otpauth", "otpauth-secret", "TOTP Settings", "TOTP Secret")
+# entries sent to a parse worker process at once
+PARSE_CHUNK_SIZE = 256
 
 
-def xpath_escape(text: str) -> str:
-    """Produce an XPath 1.0 string literal that safely represents *text*.
+def read_strings(element):
+    """Read the String fields of a KeePass entry element in one pass.
 
-    XPath 1.0 has no escape mechanism inside quoted string literals.
-    When *text* contains both ``'`` and ``"`` we use concat() to alternate
-    between the two quote types.
+    pykeepass answers every field and every protected flag with a separate
+    XPath query, which is quadratic in the number of fields. Here the entry's
+    ``String`` children are walked once and ``(strings, protected)`` is
+    returned: the key -> value dict and the set of protected keys.
     """
-    if "'" not in text:
-        return "'{}'".format(text)
-    if '"' not in text:
-        return '"{}"'.format(text)
-    # Both quotes appear: split on ' so parts are '-free and can be
-    # wrapped in single quotes; join parts with a literal ' (in double quotes).
-    parts = text.split("'")
-    inner = ", \"'\", ".join("'{}'".format(p) for p in parts)
-    return "concat({})".format(inner)
+    strings = {}
+    protected = set()
+    for string in element.iterchildren("String"):
+        key = value = None
+        for child in string:
+            if child.tag == "Key":
+                key = child.text
+            elif child.tag == "Value":
+                value = child
+
+        if value is None:
+            strings[key] = None
+            continue
+
+        strings[key] = value.text
+        if value.get("Protected", "False") == "True":
+            protected.add(key)
+
+    return strings, protected
+
+
+def read_binaries(element):
+    """Return the (filename, binary pool index) of every attachment of an entry element."""
+    return [(binary.findtext("Key"), int(binary.find("Value").get("Ref"))) for binary in element.iterchildren("Binary")]
+
+
+def serialize_entry(element):
+    """Serialize the parts of an entry element Converter._transform_entry
+    reads, leaving out its history."""
+    parts = [etree.tostring(child, with_tail=False) for child in element.iterchildren("UUID", "String", "Binary")]
+    return b"<Entry>" + b"".join(parts) + b"</Entry>"
+
+
+# Converter holding the settings of the parse worker processes
+_parse_worker = None
+
+
+def _init_parse_worker(organization_id, coll_id, path2name, path2nameskip):
+    global _parse_worker
+    _parse_worker = Converter(None, None, None, None, organization_id, coll_id, path2name, path2nameskip, None)
+
+
+def _transform_chunk(chunk):
+    return [_parse_worker._transform_entry(etree.fromstring(xml), group, is_ref_entry)
+        for xml, group, is_ref_entry in chunk]
 
 
 class Converter():
     def __init__(self, keepass_file_path, keepass_password, keepass_keyfile_path, bitwarden_password,
-            bitwarden_organization_id, bitwarden_coll_id, path2name, path2nameskip, import_tags):
+            bitwarden_organization_id, bitwarden_coll_id, path2name, path2nameskip, import_tags, bitwarden_serve=False, jobs=1, batch_size=0, state_file_path=None, stats_file_path=None, parse_workers=1, resume_file_path=None, retries=5, timeout=120,
+            plan_file_path=None, bitwarden_client=None, stats=None, import_groups=None, import_titles=None,
+            snapshot_file_path=None, snapshot_ttl=60, export_file_path=None, export_password=None):
         self._keepass_file_path = keepass_file_path
         self._keepass_password = keepass_password
         self._keepass_keyfile_path = keepass_keyfile_path
@@ -42,294 +104,944 @@ class Converter():
         self._path2name = path2name
         self._path2nameskip = path2nameskip
         self._import_tags = import_tags
-        self._kp_ref_entries = []
-        self._entries = {}
-
-        self._member_reference_resolving_dict = {
-            "username": "U",
-            "password": "P"
-        }
-
-    def _create_bw_python_object(self, title, notes, url, totp, username, password, custom_properties, collectionId, firstlevel):
-        return {
-            "organizationId": self._bitwarden_organization_id,
-            "collectionIds": collectionId,
-            "firstlevel": firstlevel,
-            "folderId": None,
-            "type":1,
-            "name": title,
-            "notes":notes,
-            "favorite":False,
-            "fields":[{"name": key,"value": value[0],"type": value[1]} for key, value in custom_properties.items() if value[0] is not None and len(value[0]) <= MAX_BW_ITEM_LENGTH],
-            "login": {
-                "uris":[
-                    {"match": None,"uri": url}
-                ] if url else [],
-                "username": username,
-                "password":password,
-                "totp": totp,
-                "passwordRevisionDate": None
-            },
-            "secureNote": None,
-            "card": None,
-            "identity": None
-        }
-
-    def _generate_folder_name(self, entry):
-        if not entry.group.path or entry.group.path == "/":
+        self._entry_filter = EntryFilter(import_tags, import_groups, import_titles)
+        self._bitwarden_serve = bitwarden_serve
+        self._jobs = jobs
+        self._batch_size = batch_size
+        self._parse_workers = parse_workers
+        self._state = SyncState(state_file_path) if state_file_path else None
+        self._uploads = self._state.uploads if self._state else UploadCache()
+        self._resume_file_path = resume_file_path
+        self._retries = retries
+        self._timeout = timeout
+        self._plan_file_path = plan_file_path
+        self._export_file_path = export_file_path
+        self._export_password = export_password
+        self._snapshot = VaultSnapshot(snapshot_file_path, bitwarden_password, snapshot_ttl * 60) if snapshot_file_path else None
+        self._journal = None
+        self._incomplete = 0
+        self._attachment_stats = {"uploaded": 0, "uploaded_bytes": 0, "skipped": 0, "skipped_bytes": 0}
+        self._binary_pool = None
+        self._stats_file_path = stats_file_path
+        self._stats = stats if stats else RunStats()
+        # connected client shared by the jobs of a manifest run
+        self._bitwarden_client = bitwarden_client
+        self._progress_lock = threading.Lock()
+        self._progress = 0
+        self._progress_max = 0
+        self._kp_entries = []
+        self._group_cache = {}
+        self._kp_ref_entries = {}
+        self._kp_ref_ids = set()
+        self._kp_ref_index = None
+        self._kp_ref_merges = {}
+        self._kp_ref_standalone_entries = []
+        self._kp_ref_mtimes = {}
+        self._entry_count = 0
+
+    def _generate_folder_name(self, path):
+        if not path or path == "/":
             return None
         else:
-            return "/".join(entry.group.path)
+            return "/".join(path)
           
-    def _generate_prefix(self, entry, skip):
-        if not entry.group.path or entry.group.path == "/":
+    def _generate_prefix(self, path, skip):
+        if not path or path == "/":
             return None
         else:
-            out=""
-            for item in islice(entry.group.path, skip, None):
-                out += item +  ' / '
-            return out
+            return "".join(item + ' / ' for item in islice(path, skip, None))
 
-    def _get_folder_firstlevel(self, entry):
-        if not entry.group.path or entry.group.path == "/":
+    def _get_folder_firstlevel(self, path):
+        if not path or path == "/":
             return None
         else:
-            return entry.group.path[0]
+            return path[0]
 
-    def _add_bw_entry_to_entries_dict(self, entry, custom_protected):
-        folder = self._generate_folder_name(entry)
+    def _group_info(self, path):
+        """Return (folder, prefix, firstlevel) of the entries in a group."""
+        folder = self._generate_folder_name(path)
         prefix = ""
         if folder and self._path2name:
-            prefix = self._generate_prefix(entry, self._path2nameskip)
+            prefix = self._generate_prefix(path, self._path2nameskip)
 
-        custom_properties = {}
-        for key, value in entry.custom_properties.items():
-            if key in custom_protected:
-                custom_properties[key] = [value, 1]
-            else:
-                custom_properties[key] = [value, 0]
-
-        bw_item_object = self._create_bw_python_object(
-            title = prefix + entry.title if entry.title else prefix + '_untitled',
-            notes =  entry.notes if entry.notes and len(entry.notes) <= MAX_BW_ITEM_LENGTH else '',
-            url = entry.url if entry.url else '',
-            totp = entry.otp if entry.otp else '',
-            username = entry.username if entry.username else '',
-            password = entry.password if entry.password else '',
-            custom_properties = custom_properties,
-            collectionId = self._bitwarden_coll_id,
-            firstlevel = self._get_folder_firstlevel(entry)
-        )
+        return folder, prefix, self._get_folder_firstlevel(path)
+
+    def _build_group_cache(self, root_group):
+        """Compute the _group_info of every group in one traversal of the
+        tree, keyed by the group's UUID. pykeepass' ``group.path`` walks up to
+        the root again for every entry asking for it."""
+        cache = {}
+        # (group element, names of its named ancestors below the root)
+        stack = [(child, []) for child in root_group.iterchildren("Group")]
+        cache[root_group.findtext("UUID")] = self._group_info([])
+        while stack:
+            element, ancestors = stack.pop()
+            name = element.findtext("Name")
+            # same as Group.path: ancestors without a name are left out
+            cache[element.findtext("UUID")] = self._group_info(ancestors + [name])
+            named = ancestors + [name] if name is not None else ancestors
+            stack.extend((child, named) for child in element.iterchildren("Group"))
+
+        return cache
+
+    def _entry_group(self, entry):
+        group = self._group_cache.get(entry._element.getparent().findtext("UUID"))
+        if group is None:
+            group = self._group_info(entry.group.path)
+        return group
+
+    def _kp_id(self, entry):
+        return str(entry.uuid).replace("-", "").upper()
 
+    def _transform_entry(self, element, group, is_ref_entry):
+        """Build (item, long_fields, binaries) from a KeePass entry element
+        and the _group_info of its group. long_fields are the (name, key) of
+        the fields to upload as name.txt, their values stay in the db. Only
+        the element is read, so this also runs in parse worker processes on
+        entries sent there by serialize_entry."""
+        strings, protected = read_strings(element)
+        entry_custom_properties = {key: value for key, value in strings.items() if key not in reserved_keys}
+
+        # REF entries got their OTP fallback in _load_keepass_data already
+        otp = strings.get("otp")
+        if not otp and not is_ref_entry:
+            otp = self._fallback_otp(entry_custom_properties)
+
+        folder, prefix, firstlevel = group
+
+        # fields too long for bw become attachments
+        fields = [(key, value, 1 if key in protected else 0)
+            for key, value in entry_custom_properties.items() if value is not None and len(value) <= MAX_BW_ITEM_LENGTH]
+
+        kp_id = uuid.UUID(bytes=base64.b64decode(element.findtext("UUID"))).hex.upper()
+        title = strings.get("Title")
+        notes = strings.get("Notes")
+        item = ItemRecord(
+            kp_id = kp_id,
+            folder = folder,
+            name = prefix + title if title else prefix + '_untitled',
+            notes =  notes if notes and len(notes) <= MAX_BW_ITEM_LENGTH else '',
+            url = strings.get("URL") or '',
+            username = strings.get("UserName") or '',
+            password = strings.get("Password") or '',
+            totp = otp if otp else '',
+            fields = fields,
+            collection_ids = self._bitwarden_coll_id,
+            firstlevel = firstlevel
+        )
 
         # get attachments to store later on
-        attachments = [(key, value) for key,value in entry.custom_properties.items() if value is not None and len(value) > MAX_BW_ITEM_LENGTH]
+        long_fields = [(key, key) for key,value in entry_custom_properties.items() if value is not None and len(value) > MAX_BW_ITEM_LENGTH]
 
-        if entry.notes and len(entry.notes) > MAX_BW_ITEM_LENGTH:
-            attachments.append(("notes", entry.notes))
+        if notes and len(notes) > MAX_BW_ITEM_LENGTH:
+            long_fields.append(("notes", "Notes"))
 
-        if entry.attachments or attachments:
-            attachments += entry.attachments
-            self._entries[str(entry.uuid).replace("-", "").upper()] = (folder, bw_item_object, attachments)
+        return item, long_fields, read_binaries(element)
 
-        else:
-            self._entries[str(entry.uuid).replace("-", "").upper()] = (folder, bw_item_object)
+    def _create_bw_entry(self, element, item, long_fields, binaries):
+        """Complete a transformed entry, adding the URLs merged in from
+        matching REF entries and handles of the attachments to upload."""
+        for url, otp in self._kp_ref_merges.get(item.kp_id, []):
+            item.uris.append(url)
+            # Merge TOTP from the REF entry if the original lacks one
+            if otp and not item.totp:
+                item.totp = otp
 
-    def _parse_kp_ref_string(self, ref_string):
-        # {REF:U@I:CFC0141068E83547BCEEAF0C1ADABAE0}
-        tokens = ref_string.split(":")
+        if binaries or long_fields:
+            item.attachments = [FieldAttachment(name + ".txt", key, element) for name, key in long_fields]
+            item.attachments += [self._binary_pool.attachment(filename, binary_id) for filename, binary_id in binaries]
 
-        if len(tokens) != 3:
-            raise Exception("Invalid REF string found")
+        return item
 
-        ref_compare_string = tokens[2][:-1]
-        field_referenced, lookup_mode = tokens[1].split("@")
+    def _fallback_otp(self, custom_properties):
+        # Fall back to custom properties for OTP if standard field is empty
+        for otp_key in OTP_CUSTOM_PROPERTY_KEYS:
+            if otp_key in custom_properties:
+                return custom_properties[otp_key]
+        return None
 
-        return (field_referenced, lookup_mode, ref_compare_string)
+    def _apply_otp_fallback(self, entry, custom_properties):
+        if not entry.otp:
+            otp = self._fallback_otp(custom_properties)
+            if otp is not None:
+                entry.otp = otp
 
-    def _get_referenced_entry(self, lookup_mode, ref_compare_string):
-        if lookup_mode == "I":
-            # KP_ID lookup
-            try:
-                return self._entries[ref_compare_string.upper()]
-            except Exception as e:
-                logging.warning(f"!! - Could not resolve REF to {ref_compare_string} !!")
-                raise e
-        else:
-            raise Exception("Unsupported REF lookup_mode")
+    def _select_entries(self, kp):
+        """Return the entries to import and the number of entries in the db.
+        The filter runs on the raw XML, entries it drops are never wrapped
+        or parsed."""
+        entries = []
+        total = 0
+        for element in kp.root_group._element.iter("Entry"):
+            parent = element.getparent()
+            if parent.tag == "History":
+                continue
 
-    def _find_referenced_value(self, ref_entry, field_referenced):
-        for member, reference_key in self._member_reference_resolving_dict.items():
-            if field_referenced == reference_key:
-                return ref_entry["login"][member]
+            total += 1
+            group = self._group_cache.get(parent.findtext("UUID"))
+            if self._entry_filter.matches(element, group[0] if group else None):
+                entries.append(Entry(element=element, kp=kp))
 
-        raise Exception("Unsupported REF field_referenced")
+        return entries, total
 
     def _load_keepass_data(self):
-        # aggregate entries
-        kp = PyKeePass(
-            filename=self._keepass_file_path,
-            password=self._keepass_password,
-            keyfile=self._keepass_keyfile_path)
+        """Open the db and do a cheap first pass over it. Only the REF entries
+        and an index of the entries they may point to are kept, the items
+        themselves are built by _iter_entries while they are uploaded."""
+        if self._import_tags and not isinstance(self._import_tags, list):
+            logging.error("The import_tags parameter must be a list of strings.")
+            raise SystemExit
+
+        with self._stats.phase("load.decrypt"):
+            kp = PyKeePass(
+                filename=self._keepass_file_path,
+                password=self._keepass_password,
+                keyfile=self._keepass_keyfile_path)
 
         # reset data structures
-        self._kp_ref_entries = []
-        self._entries = {}
-
-        logging.info(f"Found {len(kp.entries)} entries in KeePass DB. Parsing now...")
-        for entry in kp.entries:
-            # Fall back to custom properties for OTP if standard field is empty
-            if not entry.otp:
-                for otp_key in OTP_CUSTOM_PROPERTY_KEYS:
-                    if otp_key in entry.custom_properties:
-                        entry.otp = entry.custom_properties[otp_key]
-                        break
+        self._binary_pool = BinaryPool(kp)
+        self._group_cache = self._build_group_cache(kp.root_group._element)
+        self._kp_entries, total = self._select_entries(kp)
+        self._kp_ref_entries = {}
+        self._kp_ref_ids = set()
+        self._kp_ref_index = None
+        self._kp_ref_merges = {}
+        self._kp_ref_standalone_entries = []
+        self._kp_ref_mtimes = {}
+        self._entry_count = 0
 
-            # prevent not iterable errors at "in" checks
-            username = entry.username if entry.username else ''
-            password = entry.password if entry.password else ''
+        if self._entry_filter.active:
+            logging.info(f"Selected {len(self._kp_entries)} of {total} entries in KeePass DB. Parsing now...")
+        else:
+            logging.info(f"Found {total} entries in KeePass DB. Parsing now...")
+        lookup_modes = set()
+        for entry in self._kp_entries:
+            strings, protected = read_strings(entry._element)
+            references = find_references(strings)
 
-            # Skip REFs as ID might not be in dict yet
-            if KP_REF_IDENTIFIER in username or KP_REF_IDENTIFIER in password:
-                self._kp_ref_entries.append(entry)
+            # Skip REFs as their targets might not be known yet
+            if references:
+                self._apply_otp_fallback(entry, {key: value for key, value in strings.items() if key not in reserved_keys})
+                kp_id = self._kp_id(entry)
+                self._kp_ref_entries[kp_id] = (entry, references)
+                self._kp_ref_ids.add(kp_id)
+                lookup_modes.update(mode for refs in references.values() for field, mode, search in refs)
                 continue
 
-            custom_protected = []
-            for field, value in entry.custom_properties.items():
-                if entry._xpath('String[Key[text()={}]]/Value'.format(xpath_escape(field)), first=True).attrib.get("Protected", "False") == "True":
-                    custom_protected.append(field)
-
-            # Normal entry
-            if self._import_tags:
-                if isinstance(self._import_tags, list):
-                    for tag in self._import_tags:
-                        if entry.tags != None:
-                            if tag in entry.tags:
-                                self._add_bw_entry_to_entries_dict(entry, custom_protected)
-                            else: pass
-                        else: pass
-                else:
-                    logging.error("The import_tags parameter must be a list of strings.")
-                    raise SystemExit
-                
-            else:self._add_bw_entry_to_entries_dict(entry, custom_protected)
+            self._entry_count += 1
+
+        # index the entries REFs can point to, by the lookup modes in use
+        if self._kp_ref_entries:
+            self._kp_ref_index = ReferenceIndex(lookup_modes)
+            for entry in self._kp_entries:
+                self._kp_ref_index.add(self._kp_id(entry), entry, read_strings(entry._element)[0] if lookup_modes != {"I"} else {})
 
-        logging.info(f"Parsed {len(self._entries)} entries")
+        logging.info(f"Parsed {self._entry_count} entries")
+
+    def _ref_dependencies(self, kp_id, references):
+        """Return the kp_ids of the entries the REFs of an entry point to."""
+        targets = set()
+        for refs in references.values():
+            for field, lookup_mode, search in refs:
+                target = self._kp_ref_index.lookup(lookup_mode, search)
+                if target is None:
+                    raise Exception(f"Could not resolve REF to {search}")
+                targets.add(target)
+        targets.discard(kp_id)
+        return targets
+
+    def _resolve_entry_references(self, kp_id, kp_entry, references):
+        """Replace the REFs of an entry with the values they point to and
+        return the kp_ids its username / password REFs point to."""
+        credential_targets = []
+        for member, refs in references.items():
+            def replace(match):
+                target = self._kp_ref_index.lookup(match.group(2).upper(), match.group(3))
+                if member in ("username", "password"):
+                    credential_targets.append(target)
+                return self._kp_ref_index.value(target, match.group(1).upper())
+
+            setattr(kp_entry, member, KP_REF_PATTERN.sub(replace, getattr(kp_entry, member)))
+
+        return credential_targets
 
     def _resolve_entries_with_references(self):
+        """Resolve the REF entries in dependency order, so REFs pointing to
+        other REF entries see resolved values. Each REF is looked up in the
+        ReferenceIndex once, entries on a REF cycle are not imported."""
         ref_entries_length = len(self._kp_ref_entries)
 
         if ref_entries_length == 0:
             return
 
         logging.info(f"Resolving {ref_entries_length} REF entries now...")
-        for kp_entry in self._kp_ref_entries:
+        failed = set()
+        targets = {}
+        dependencies = {}
+        for kp_id, (kp_entry, references) in self._kp_ref_entries.items():
             try:
-                # replace values
-                replaced_entries = []
-                for member in self._member_reference_resolving_dict.keys():
-                    if KP_REF_IDENTIFIER in getattr(kp_entry, member):
-                        field_referenced, lookup_mode, ref_compare_string = self._parse_kp_ref_string(getattr(kp_entry, member))
-                        folder, ref_entry = self._get_referenced_entry(lookup_mode, ref_compare_string)
+                targets[kp_id] = self._ref_dependencies(kp_id, references)
+            except Exception as e:
+                logging.warning(f"!! - {e} !!")
+                failed.add(kp_id)
+                targets[kp_id] = set()
+            dependencies[kp_id] = targets[kp_id] & self._kp_ref_ids
 
-                        value = self._find_referenced_value(ref_entry, field_referenced)
-                        setattr(kp_entry, member, value)
+        order, cyclic = topological_order(dependencies)
+        for kp_id in cyclic:
+            kp_entry = self._kp_ref_entries[kp_id][0]
+            logging.warning(f"!! Could not resolve entry for {kp_entry.group.path}{kp_entry.title} [{str(kp_entry.uuid)}], its REFs form a cycle !!")
 
-                        replaced_entries.append(ref_entry)
+        # REF entries merged into another item: kp_id -> kp_id of that item
+        merged_into = {}
+        for kp_id in order:
+            kp_entry, references = self._kp_ref_entries[kp_id]
+            try:
+                if kp_id in failed or dependencies[kp_id] & failed:
+                    raise Exception("Unresolved REF")
+
+                # replace values
+                credential_targets = self._resolve_entry_references(kp_id, kp_entry, references)
+                self._kp_ref_mtimes[kp_id] = self._combined_mtime(kp_entry, targets[kp_id])
 
                 # handle storing bitwarden style
-                username_and_password_match = True
-                for ref_entry in replaced_entries:
-                    if ref_entry["login"]["username"] != kp_entry.username or ref_entry["login"]["password"] != kp_entry.password:
+                username_and_password_match = bool(credential_targets)
+                for ref_id in credential_targets:
+                    ref_entry = self._kp_ref_index.entry(ref_id)
+                    if (ref_entry.username or '') != (kp_entry.username or '') or (ref_entry.password or '') != (kp_entry.password or ''):
                         username_and_password_match = False
                         break
 
                 if username_and_password_match:
                     # => add url to bw_item => username / pw identical
-                    ref_entry["login"]["uris"].append({"match": None,"uri": kp_entry.url})
-                    # Merge TOTP from the REF entry if the original lacks one
-                    if kp_entry.otp and not ref_entry["login"].get("totp"):
-                        ref_entry["login"]["totp"] = kp_entry.otp
+                    ref_id = merged_into.get(ref_id, ref_id)
+                    merged_into[kp_id] = ref_id
+                    self._kp_ref_merges.setdefault(ref_id, []).append((kp_entry.url, kp_entry.otp))
                 else:
                     # => create new bitwarden item
-                    self._add_bw_entry_to_entries_dict(kp_entry, [])
+                    self._kp_ref_standalone_entries.append(kp_entry)
+                    self._entry_count += 1
 
             except Exception as e:
+                failed.add(kp_id)
                 logging.warning(f"!! Could not resolve entry for {kp_entry.group.path}{kp_entry.title} [{str(kp_entry.uuid)}] !!")
 
+        # items receiving URLs change with the REF entries merged into them
+        merged_ids = {}
+        for kp_id, ref_id in merged_into.items():
+            merged_ids.setdefault(ref_id, set()).add(kp_id)
+        for ref_id, kp_ids in merged_ids.items():
+            self._kp_ref_mtimes[ref_id] = self._combined_mtime(self._kp_ref_index.entry(ref_id), kp_ids)
+
+        # the REF entries are not needed anymore
+        self._kp_ref_entries = {}
+        self._kp_ref_index = None
+
         logging.debug(f"Resolved {ref_entries_length} REF entries")
 
-    def _create_bitwarden_items_for_entries(self):
-        i = 1
-        max_i = len(self._entries)
+    def _entry_mtime(self, entry):
+        if self._kp_ref_mtimes:
+            kp_id = self._kp_id(entry)
+            if kp_id in self._kp_ref_mtimes:
+                return self._kp_ref_mtimes[kp_id]
+        return entry.mtime.isoformat() if entry.mtime else None
 
-        logging.info(f"Connecting and reading existing folders and entries")
+    def _combined_mtime(self, entry, dependency_ids):
+        """Return the mtime of an entry whose item also holds values of the
+        entries ``dependency_ids``: REF targets, or REF entries merged into
+        it. It changes whenever one of them changes, or the set of them
+        does, so an incremental sync rebuilds the item. None if any mtime is
+        unknown."""
+        mtime = self._entry_mtime(entry)
+        dependency_mtimes = [(kp_id, self._entry_mtime(self._kp_ref_index.entry(kp_id))) for kp_id in sorted(dependency_ids)]
+        if mtime is None or any(dependency_mtime is None for kp_id, dependency_mtime in dependency_mtimes):
+            return None
+
+        digest = hashlib.sha256(json.dumps(dependency_mtimes).encode("utf-8")).hexdigest()
+        return f"{mtime}+{digest[:16]}"
 
-        with BitwardenClient(self._bitwarden_password, self._bitwarden_organization_id) as bw:
+    def _is_unchanged(self, kp_id, entry):
+        return self._state is not None and self._state.is_unchanged(kp_id, self._entry_mtime(entry))
 
-            #if self._bitwarden_coll_id == 'auto':
-                # lookup collections
-            
+    def _is_done(self, kp_id):
+        # finished by the interrupted run this one resumes
+        return self._journal is not None and kp_id in self._journal.done
 
+    def _iter_selected_entries(self):
+        """Yield (entry, is_ref_entry) for every KeePass entry to import."""
+        for entry in self._kp_entries:
+            # REF entries were resolved in place and no longer look like REFs
+            kp_id = self._kp_id(entry)
+            if kp_id in self._kp_ref_ids or self._is_done(kp_id) or self._is_unchanged(kp_id, entry):
+                continue
 
-            for kp_id, value in self._entries.items():
+            yield entry, False
 
-                if len(value) == 2:
-                    (folder, bw_item_object) = value
-                    attachments = None
-                else:
-                    (folder, bw_item_object, attachments) = value
-
-                # collection
-                collectionId = None
-                collInfo=""
-                if bw_item_object["firstlevel"]:
-                    if self._bitwarden_coll_id == 'auto':
-                        logging.info(f"Searching Collection {bw_item_object['firstlevel']}")
-                        collectionId = bw.create_org_get_collection(bw_item_object['firstlevel'])
-                        collInfo=" in specified Collection " + bw_item_object['firstlevel']
-
-                    elif self._bitwarden_coll_id:
-                        collectionId = self._bitwarden_coll_id
-                        collInfo=" in specified Collection "
-                
-            
-                # update object
-                del bw_item_object["firstlevel"]
-                bw_item_object["collectionIds"] = collectionId
-            
-                logging.info(f"[{i} of {max_i}] Creating Bitwarden entry in {folder} for {bw_item_object['name']}{collInfo}...")
-
-                # create entry
-                output = bw.create_entry(folder, bw_item_object)
-                if "error" in output.lower():
-                    logging.error(f"!! ERROR: Creation of entry failed: {output} !!")
-                    i += 1
+        for entry in self._kp_ref_standalone_entries:
+            kp_id = self._kp_id(entry)
+            if not self._is_done(kp_id) and not self._is_unchanged(kp_id, entry):
+                yield entry, True
+
+    def _iter_entries(self):
+        """Yield the ItemRecord of every entry to import. Items are built one
+        at a time, as they are consumed."""
+        if self._parse_workers > 1:
+            transformed_entries = self._transform_entries_in_pool()
+        else:
+            transformed_entries = self._transform_entries()
+
+        for entry, transformed in transformed_entries:
+            item = self._create_bw_entry(entry._element, *transformed)
+            item.mtime = self._entry_mtime(entry)
+            yield item
+
+    def _transform_entries(self):
+        for entry, is_ref_entry in self._iter_selected_entries():
+            start = time.perf_counter()
+            transformed = self._transform_entry(entry._element, self._entry_group(entry), is_ref_entry)
+            self._stats.add_phase_time("build", time.perf_counter() - start)
+            yield entry, transformed
+
+    def _transform_entries_in_pool(self):
+        """Transform the selected entries in chunks across parse worker
+        processes. Chunks are collected in the order they were sent, so the
+        items come out in the same order as without workers, and only a few
+        chunks are in flight at a time."""
+        logging.info(f"Transforming entries with {self._parse_workers} parse worker processes")
+        settings = (self._bitwarden_organization_id, self._bitwarden_coll_id, self._path2name, self._path2nameskip)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self._parse_workers, mp_context=context, initializer=_init_parse_worker, initargs=settings) as executor:
+            selected_entries = self._iter_selected_entries()
+            pending = deque()
+            while True:
+                start = time.perf_counter()
+                chunk = list(islice(selected_entries, PARSE_CHUNK_SIZE))
+                if chunk:
+                    entries = [entry for entry, is_ref_entry in chunk]
+                    payload = [(serialize_entry(entry._element), self._entry_group(entry), is_ref_entry) for entry, is_ref_entry in chunk]
+                    pending.append((entries, executor.submit(_transform_chunk, payload)))
+                    self._stats.add_phase_time("build", time.perf_counter() - start)
+
+                    if len(pending) < 2 * self._parse_workers:
+                        continue
+
+                if not pending:
+                    break
+
+                start = time.perf_counter()
+                entries, future = pending.popleft()
+                transformed_chunk = future.result()
+                self._stats.add_phase_time("build", time.perf_counter() - start)
+                yield from zip(entries, transformed_chunk)
+
+    def _next_progress(self):
+        with self._progress_lock:
+            self._progress += 1
+            return self._progress
+
+    def _assign_collection(self, bw, item):
+        # collection
+        collectionId = None
+        collInfo=""
+        if item.firstlevel:
+            if self._bitwarden_coll_id == 'auto':
+                logging.debug(f"Searching Collection {item.firstlevel}")
+                collectionId = bw.create_org_get_collection(item.firstlevel)
+                collInfo=" in specified Collection " + item.firstlevel
+
+            elif self._bitwarden_coll_id:
+                collectionId = self._bitwarden_coll_id
+                collInfo=" in specified Collection "
+
+
+        # update object
+        item.collection_ids = collectionId
+
+        return collInfo
+
+    def _attachment_key(self, attachment):
+        """Return (filename, sha256, size) of an attachment. Binaries are hashed
+        once per pool index, however many entries they are attached to."""
+        return (attachment.filename, *attachment.digest())
+
+    def _count_attachment(self, counter, size):
+        with self._progress_lock:
+            self._attachment_stats[counter] += 1
+            self._attachment_stats[counter + "_bytes"] += size
+
+    def _upload_attachments(self, bw, item_id, item):
+        """Upload the attachments the item does not have yet. Returns False
+        if an upload failed."""
+        complete = True
+        for attachment in item.attachments:
+            filename, sha256, size = self._attachment_key(attachment)
+            if self._uploads.contains(item_id, sha256, filename):
+                logging.debug(f"        - Attachment {filename} of item {item.name} is already uploaded. skipping...")
+                self._count_attachment("skipped", size)
+                continue
+
+            logging.info(f"        - Uploading attachment for item {item.name}...")
+            ok, res = bw.create_attachment(item_id, attachment)
+            if not ok:
+                logging.error(f"!! ERROR: Uploading attachment {filename} of {item.name} failed: {res} !!")
+                complete = False
+                continue
+
+            self._count_attachment("uploaded", size)
+            try:
+                uploaded = [a for a in json.loads(res).get("attachments") or [] if a.get("fileName") == filename]
+            except (ValueError, AttributeError):
+                uploaded = []
+            if uploaded:
+                self._uploads.record(item_id, sha256, filename, uploaded[-1]["id"])
+                if self._journal:
+                    self._journal.attachment(item_id, sha256, filename, uploaded[-1]["id"])
+
+        return complete
+
+    def _attachment_fingerprint(self, attachment):
+        filename, sha256, size = self._attachment_key(attachment)
+        return [filename, sha256]
+
+    def _content_hashes(self, item):
+        # hashed as the item looks before its collection is assigned, so the
+        # hashes in existing state files stay valid
+        item_json = dict(item.to_json(self._bitwarden_organization_id), firstlevel=item.firstlevel)
+        content = json.dumps([item.folder, item_json], sort_keys=True)
+        files = json.dumps([self._attachment_fingerprint(attachment) for attachment in item.attachments or []])
+        return hashlib.sha256(content.encode("utf-8")).hexdigest(), hashlib.sha256(files.encode("utf-8")).hexdigest()
+
+    def _update_bitwarden_item(self, bw, state_entry, item, attachments_hash, progressInfo):
+        logging.info(f"{progressInfo} Updating changed Bitwarden entry in {item.folder} for {item.name}...")
+
+        ok, output = bw.edit_entry(state_entry["id"], item.folder, item.to_json(self._bitwarden_organization_id))
+        if not ok:
+            logging.error(f"!! ERROR: Update of entry {item.name} failed: {output} !!")
+            return False
+
+        # replace the attachments only if they changed, keeping the ones
+        # that are still identical
+        complete = True
+        if attachments_hash != state_entry["attachments"]:
+            keep = {tuple(reversed(self._attachment_fingerprint(attachment))) for attachment in item.attachments or []}
+            old_attachments = json.loads(output).get("attachments") or []
+            for old_attachment in old_attachments:
+                if self._uploads.key_of(state_entry["id"], old_attachment["id"]) in keep:
                     continue
-                if "skip" in output:
-                    i += 1
+                ok, output = bw.delete_attachment(state_entry["id"], old_attachment["id"])
+                if not ok:
+                    logging.error(f"!! ERROR: Deleting attachment {old_attachment.get('fileName')} of {item.name} failed: {output} !!")
+                    complete = False
                     continue
+                self._uploads.forget(state_entry["id"], old_attachment["id"])
+            if item.attachments and not self._upload_attachments(bw, state_entry["id"], item):
+                complete = False
 
-                # upload attachments
-                if attachments:
-                    item_id = json.loads(output)["id"]
+        return complete
 
-                    for attachment in attachments:
-                        logging.info(f"        - Uploading attachment for item {bw_item_object['name']}...")
-                        res = bw.create_attachment(item_id, attachment)
-                        if "failed" in res:
-                            logging.error(f"!! ERROR: Uploading attachment failed: {res}")
+    def _create_bitwarden_item(self, bw, item):
+        start = time.perf_counter()
+        try:
+            self._finish_entry(item.kp_id, self._store_bitwarden_item(bw, item))
+        finally:
+            self._stats.record_entry(item.kp_id, item.name, time.perf_counter() - start)
+            self._stats.count("entries")
 
-                i += 1
+    def _finish_entry(self, kp_id, complete):
+        if complete:
+            if self._journal:
+                self._journal.entry_done(kp_id)
+        else:
+            with self._progress_lock:
+                self._incomplete += 1
 
+    def _store_bitwarden_item(self, bw, item):
+        """Create, update or skip the item of an entry. Returns True once the
+        entry is completely in Bitwarden, including its attachments."""
+        kp_id = item.kp_id
+        folder = item.folder
 
-    def convert(self):
+        # incremental sync: compare with what was imported last time
+        state_entry = None
+        if self._state:
+            content_hash, attachments_hash = self._content_hashes(item)
+            state_entry = self._state.get(kp_id)
+            if state_entry and state_entry["hash"] == content_hash and state_entry["attachments"] == attachments_hash:
+                logging.debug(f"-- Entry {item.name} is unchanged. skipping...")
+                self._state.record(kp_id, state_entry["id"], item.mtime, content_hash, attachments_hash)
+                self._next_progress()
+                return True
+
+        collInfo = self._assign_collection(bw, item)
+        progressInfo = f"[{self._next_progress()} of {self._progress_max}]"
+
+        if state_entry:
+            if not self._update_bitwarden_item(bw, state_entry, item, attachments_hash, progressInfo):
+                return False
+            self._state.record(kp_id, state_entry["id"], item.mtime, content_hash, attachments_hash)
+            return True
+
+        # created by the interrupted run this one resumes, only its
+        # attachments may be missing
+        item_id = self._journal.item_id(kp_id) if self._journal else None
+        if item_id:
+            logging.info(f"{progressInfo} Completing Bitwarden entry in {folder} for {item.name}...")
+        else:
+            logging.info(f"{progressInfo} Creating Bitwarden entry in {folder} for {item.name}{collInfo}...")
+
+            # create entry
+            ok, output = bw.create_entry(folder, item.to_json(self._bitwarden_organization_id))
+            if not ok:
+                logging.error(f"!! ERROR: Creation of entry {item.name} failed: {output} !!")
+                return False
+            if output is None:
+                # adopt the existing item, so the next incremental run knows it
+                item_id = bw.items.find(folder, item.name, org=self._bitwarden_organization_id)
+                if self._state and item_id:
+                    self._state.record(kp_id, item_id, item.mtime, content_hash, attachments_hash)
+                return True
+
+            item_id = json.loads(output)["id"]
+            if self._journal:
+                self._journal.item(kp_id, item_id, folder, item.name)
+
+        # upload attachments
+        if item.attachments and not self._upload_attachments(bw, item_id, item):
+            return False
+
+        if self._state:
+            self._state.record(kp_id, item_id, item.mtime, content_hash, attachments_hash)
+        return True
+
+    def _is_known_item(self, kp_id):
+        """Whether the entry already has an item, from the sync state or the
+        journal, that a bw import would duplicate."""
+        return bool((self._state and self._state.get(kp_id)) or (self._journal and self._journal.item_id(kp_id)))
+
+    def _import_bitwarden_items_in_batches(self, bw):
+        entries = self._iter_entries()
+
+        chunk_start = 0
+        while True:
+            chunk = list(islice(entries, self._batch_size))
+            if not chunk:
+                break
+            chunk_start += len(chunk)
+
+            # entries known from an earlier incremental run are updated in
+            # place, items an interrupted run created are completed in place
+            known = [item for item in chunk if self._is_known_item(item.kp_id)]
+            for item in known:
+                self._create_bitwarden_item(bw, item)
+            chunk = [item for item in chunk if not self._is_known_item(item.kp_id)]
+            if not chunk:
+                continue
+
+            # imported items are told apart by folder and name, entries
+            # repeating one of a chunk are created one by one after it
+            keys = set()
+            repeats = []
+            unique = []
+            for item in chunk:
+                key = (item.folder, item.name)
+                (repeats if key in keys else unique).append(item)
+                keys.add(key)
+            chunk = unique
+
+            hashes = []
+            for item in chunk:
+                hashes.append(self._content_hashes(item) if self._state else None)
+                self._assign_collection(bw, item)
+
+            logging.info(f"[{chunk_start - len(chunk) + 1}-{chunk_start} of {self._progress_max}] Importing {len(chunk)} Bitwarden entries...")
+            self._stats.count("entries", len(chunk))
+            item_ids = bw.import_entries([(item.folder, item.to_json(self._bitwarden_organization_id)) for item in chunk])
+            if item_ids is None:
+                with self._progress_lock:
+                    self._incomplete += len(chunk) + len(repeats)
+                continue
+
+            for item, item_id, content_hashes in zip(chunk, item_ids, hashes):
+                if not item_id:
+                    # skipped, adopt the existing item
+                    item_id = bw.items.find(item.folder, item.name, org=self._bitwarden_organization_id)
+                    if self._state and item_id:
+                        self._state.record(item.kp_id, item_id, item.mtime, *content_hashes)
+                    self._finish_entry(item.kp_id, True)
+                    continue
+
+                if self._journal:
+                    self._journal.item(item.kp_id, item_id, item.folder, item.name)
+
+                # attachments can not be imported, upload them per item
+                if item.attachments and not self._upload_attachments(bw, item_id, item):
+                    self._finish_entry(item.kp_id, False)
+                    continue
+
+                if self._state:
+                    self._state.record(item.kp_id, item_id, item.mtime, *content_hashes)
+                self._finish_entry(item.kp_id, True)
+
+            for item in repeats:
+                self._create_bitwarden_item(bw, item)
+
+    def _open_journal(self):
+        self._journal = Journal(self._resume_file_path)
+
+        # attachments uploaded by the interrupted run are not uploaded again
+        for record in self._journal.attachments:
+            self._uploads.record(record["item"], record["sha256"], record["name"], record["id"])
+
+    def _close_journal(self, complete):
+        """Close the journal, and remove it once every entry is in Bitwarden:
+        a later run must not skip entries because of a finished import."""
+        self._journal.close(remove=complete)
+        if complete:
+            logging.info(f"Import complete, removed the journal {self._resume_file_path}")
+        else:
+            logging.warning(f"!! The import did not complete, run again with -resume {self._resume_file_path} to continue it !!")
+
+    def _count_selected_entries(self):
+        """Count the selected entries into _progress_max and return the sets
+        of their folders and collections. Those are created up front, their
+        names only depend on the group of an entry."""
+        self._progress_max = 0
+        folders = set()
+        collections = set()
+        for entry, is_ref_entry in self._iter_selected_entries():
+            folder, prefix, firstlevel = self._entry_group(entry)
+            folders.add(folder)
+            collections.add(firstlevel)
+            self._progress_max += 1
+
+        return folders, collections
+
+    def _create_bitwarden_items_for_entries(self):
+        if self._resume_file_path:
+            self._open_journal()
+
+        self._progress = 0
+        self._incomplete = 0
+        folders, collections = self._count_selected_entries()
+
+        if self._state:
+            logging.info(f"{self._progress_max} entries are new, modified or receive URLs from REF entries since the last sync")
+
+        scheduler = None
+        complete = False
+        try:
+            if self._bitwarden_client:
+                bw = self._bitwarden_client
+                bw.use_organization(self._bitwarden_organization_id)
+                complete = self._upload_entries(bw, folders, collections)
+            else:
+                logging.info(f"Connecting and reading existing folders and entries")
+                scheduler = RequestScheduler(max_concurrency=self._jobs, max_retries=self._retries, timeout=self._timeout, stats=self._stats)
+                with self._stats.phase("connect"):
+                    bw = BitwardenClient(self._bitwarden_password, self._bitwarden_organization_id, serve=self._bitwarden_serve,
+                        stats=self._stats, journal=self._journal, scheduler=scheduler, snapshot=self._snapshot)
+
+                with bw:
+                    complete = self._upload_entries(bw, folders, collections)
+        finally:
+            if self._journal:
+                self._close_journal(complete)
+
+        if scheduler and scheduler.retries:
+            logging.info(f"Retried {scheduler.retries} bw calls, the server throttled {scheduler.throttled} of them")
+
+        stats = self._attachment_stats
+        if stats["uploaded"] or stats["skipped"]:
+            logging.info(f"Attachments: {stats['uploaded']} uploaded ({stats['uploaded_bytes']} bytes), "
+                f"{stats['skipped']} already present ({stats['skipped_bytes']} bytes saved)")
+
+    def _plan_entry(self, bw, plan, item):
+        """Record in the plan what _store_bitwarden_item would do with the
+        entry, using only the vault state read at connect."""
+        kp_id = item.kp_id
+        folder = item.folder
+        name = item.name
+
+        action = CREATE
+        uploads = item.attachments or []
+        if self._state:
+            content_hash, attachments_hash = self._content_hashes(item)
+            state_entry = self._state.get(kp_id)
+            if state_entry and state_entry["hash"] == content_hash and state_entry["attachments"] == attachments_hash:
+                plan.item(UNCHANGED, kp_id, folder, name)
+                return
+            if state_entry:
+                action = UPDATE
+                item_id = state_entry["id"]
+                if attachments_hash == state_entry["attachments"]:
+                    uploads = []
+
+        if action == CREATE and self._journal and self._journal.item_id(kp_id):
+            action = COMPLETE
+            item_id = self._journal.item_id(kp_id)
+        elif action == CREATE and bw.has_entry(folder, name):
+            action = SKIP
+            uploads = []
+
+        # collections are assigned before an existing item is skipped
+        collection = None
+        if item.firstlevel:
+            if self._bitwarden_coll_id == 'auto':
+                collection = item.firstlevel
+                if not bw.has_collection(collection):
+                    plan.collection(collection)
+            elif self._bitwarden_coll_id:
+                collection = self._bitwarden_coll_id
+
+        if action in (CREATE, UPDATE) and folder and not bw.has_folder(folder):
+            plan.folder(folder)
+
+        files = []
+        for attachment in uploads:
+            filename, sha256, size = self._attachment_key(attachment)
+            if action != CREATE and self._uploads.contains(item_id, sha256, filename):
+                continue
+            files.append((filename, size))
+
+        plan.item(action, kp_id, folder, name, collection, files)
+
+    def _plan_bitwarden_items_for_entries(self):
+        # an interrupted import is planned from the vault state in its journal
+        if self._resume_file_path and os.path.isfile(self._resume_file_path):
+            self._open_journal()
+
+        logging.info(f"Connecting and reading existing folders and entries")
+        try:
+            with self._stats.phase("connect"):
+                bw = BitwardenClient(self._bitwarden_password, self._bitwarden_organization_id, serve=self._bitwarden_serve,
+                    stats=self._stats, journal=self._journal, snapshot=self._snapshot)
+
+            plan = ImportPlan(self._batch_size)
+            with bw:
+                for item in self._iter_entries():
+                    self._plan_entry(bw, plan, item)
+        finally:
+            if self._journal:
+                self._journal.close()
+
+        plan.write(self._plan_file_path)
+
+        summary = plan.summary()
+        logging.info(f"Plan: {summary[CREATE]} entries to create, {summary[UPDATE]} to update, {summary[COMPLETE]} to complete, "
+            f"{summary[SKIP]} already in Bitwarden, {summary[UNCHANGED]} unchanged")
+        logging.info(f"Plan: {summary['folders']} folders and {summary['collections']} collections to create, "
+            f"{summary['attachments']} attachments to upload ({summary['attachment_bytes']} bytes), about {summary['bw_writes']} bw write calls")
+        logging.info(f"Wrote the import plan to {self._plan_file_path}, nothing was written to Bitwarden")
+
+    def _export_entries(self):
+        """Write the selected entries to a Bitwarden export file, through
+        the same folder, collection and entry calls as an upload."""
+        folders, collections = self._count_selected_entries()
+        left_out = 0
+
+        with BitwardenExport(self._export_file_path, self._bitwarden_organization_id, self._export_password) as export:
+            with self._stats.phase("folders"):
+                self._create_folders_and_collections(export, folders, collections)
+
+            for item in self._iter_entries():
+                self._assign_collection(export, item)
+                logging.debug(f"[{self._next_progress()} of {self._progress_max}] Exporting entry in {item.folder} for {item.name}...")
+                export.create_entry(item.folder, item.to_json(self._bitwarden_organization_id))
+                self._stats.count("entries")
+
+                if item.attachments:
+                    left_out += len(item.attachments)
+                    logging.warning(f"!! Entry {item.name} has {len(item.attachments)} attachments or long fields, they can not be exported !!")
+
+        kind = "encrypted Bitwarden export" if self._export_password else "Bitwarden export"
+        logging.info(f"Wrote {export.entries} entries to the {kind} {self._export_file_path}")
+        if left_out:
+            logging.warning(f"!! {left_out} attachments and long fields were left out of the export, upload them with bw !!")
+
+    def _upload_entries(self, bw, folders, collections):
+        """Store the selected entries in Bitwarden. Returns True if every
+        entry made it completely."""
+        try:
+            with self._stats.phase("folders"):
+                self._create_folders_and_collections(bw, folders, collections)
+            self._process_entries(bw)
+            return self._incomplete == 0
+        finally:
+            if self._state:
+                self._state.save()
+
+    def _create_folders_and_collections(self, bw, folders, collections):
+        # bw import creates the folders of a batch itself
+        if not self._batch_size:
+            bw.create_folders(folders, self._jobs)
+
+        if self._bitwarden_coll_id == 'auto':
+            bw.create_org_collections(collections, self._jobs)
+
+    def _process_entries(self, bw):
+        if self._batch_size:
+            self._import_bitwarden_items_in_batches(bw)
+            return
+
+        if self._jobs <= 1:
+            for item in self._iter_entries():
+                self._create_bitwarden_item(bw, item)
+            return
+
+        logging.info(f"Creating entries with {self._jobs} parallel workers")
+        with ThreadPoolExecutor(max_workers=self._jobs) as executor:
+            # keep only a small window of built items in flight, so the
+            # memory used does not grow with the size of the db
+            in_flight = set()
+            for item in self._iter_entries():
+                if len(in_flight) >= 2 * self._jobs:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+
+                    # re-raise the first worker failure, like the sequential loop would
+                    for future in done:
+                        future.result()
+
+                in_flight.add(executor.submit(self._create_bitwarden_item, bw, item))
+
+            for future in in_flight:
+                future.result()
+
+    def load(self):
+        """Decrypt the db and resolve its REFs, the part of a conversion that
+        does not talk to Bitwarden."""
         # load keepass data from database
-        self._load_keepass_data()
+        with self._stats.phase("load"):
+            self._load_keepass_data()
 
         # resolve {REF:...} stuff
-        self._resolve_entries_with_references()
+        with self._stats.phase("resolve"):
+            self._resolve_entries_with_references()
+
+    def upload(self):
+        """Store the entries of a loaded db in Bitwarden, or only plan or
+        export it."""
+        # write an export file instead of talking to bw
+        if self._export_file_path:
+            with self._stats.phase("export"):
+                self._export_entries()
+            return
 
-        # store aggregated entries in bw
-        self._create_bitwarden_items_for_entries()
+        # only compute what the import would change
+        if self._plan_file_path:
+            with self._stats.phase("plan"):
+                self._plan_bitwarden_items_for_entries()
+            return
+
+        # stream entries into bw while they are built
+        with self._stats.phase("upload"):
+            self._create_bitwarden_items_for_entries()
+
+    def convert(self):
+        try:
+            self.load()
+            self.upload()
+        finally:
+            if self._stats_file_path:
+                self._stats.write(self._stats_file_path)
+                logging.info(f"Wrote run statistics to {self._stats_file_path}")
 
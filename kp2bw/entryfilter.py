@@ -0,0 +1,58 @@
+from fnmatch import fnmatchcase
+
+
+class EntryFilter():
+    """Selects the entries to import by tags, group subtrees and title globs,
+    on the raw XML of an entry, before anything else is read from it.
+
+    An entry matches if it has one of ``tags``, lies in or below one of the
+    ``groups`` (paths like ``Team A/Servers``) and its title matches one of
+    the ``titles`` globs. Criteria that are not given match every entry.
+    """
+
+    def __init__(self, tags=None, groups=None, titles=None):
+        self._tags = set(tags) if tags else None
+        self._groups = [group.strip("/") for group in groups] if groups else None
+        self._titles = list(titles) if titles else None
+        # folder name -> whether its entries are selected
+        self._folders = {}
+
+    @property
+    def active(self):
+        return self._tags is not None or self._groups is not None or self._titles is not None
+
+    def _folder_selected(self, folder):
+        if self._groups is None:
+            return True
+
+        selected = self._folders.get(folder)
+        if selected is None:
+            selected = folder is not None and any(folder == group or folder.startswith(group + "/") for group in self._groups)
+            self._folders[folder] = selected
+        return selected
+
+    @staticmethod
+    def _title(element):
+        for string in element.iterchildren("String"):
+            if string.findtext("Key") == "Title":
+                return string.findtext("Value") or ""
+        return ""
+
+    def matches(self, element, folder):
+        """Return whether the entry element, in the group with the folder
+        name ``folder`` (None for the root group), is selected."""
+        if not self._folder_selected(folder):
+            return False
+
+        if self._tags is not None:
+            # same separators as pykeepass' Entry.tags
+            tags = element.findtext("Tags")
+            if not tags or self._tags.isdisjoint(tags.replace(",", ";").split(";")):
+                return False
+
+        if self._titles is not None:
+            title = self._title(element)
+            if not any(fnmatchcase(title, pattern) for pattern in self._titles):
+                return False
+
+        return True
@@ -0,0 +1,215 @@
+import base64
+import hashlib
+import hmac
+import io
+import json
+import os
+import tempfile
+import threading
+import uuid
+
+from Cryptodome.Cipher import AES
+from Cryptodome.Util.Padding import pad
+
+# PBKDF2-HMAC-SHA256 rounds of password protected exports, the default of the Bitwarden clients
+EXPORT_KDF_ITERATIONS = 600000
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def _hkdf_expand(key, info):
+    # a single block of HKDF-Expand, how Bitwarden stretches a key to 64 bytes
+    return hmac.new(key, info + b"\x01", hashlib.sha256).digest()
+
+
+class _EncryptingWriter():
+    """Text sink writing the cipher text part of a Bitwarden EncString of
+    type 2 (AES-256-CBC, HMAC-SHA256) to ``f``, base64 encoded as it goes."""
+
+    def __init__(self, f, enc_key, mac_key, iv):
+        self._f = f
+        self._cipher = AES.new(enc_key, AES.MODE_CBC, iv=iv)
+        self._mac = hmac.new(mac_key, iv, hashlib.sha256)
+        self._plain = b""
+        self._encrypted = b""
+
+    def write(self, text):
+        self._plain += text.encode("utf-8")
+        usable = len(self._plain) - len(self._plain) % AES.block_size
+        if usable:
+            self._encrypt(self._plain[:usable])
+            self._plain = self._plain[usable:]
+
+    def _encrypt(self, data, final=False):
+        encrypted = self._cipher.encrypt(data)
+        self._mac.update(encrypted)
+        self._encrypted += encrypted
+
+        # base64 only whole 3 byte groups, unless nothing follows
+        usable = len(self._encrypted) if final else len(self._encrypted) - len(self._encrypted) % 3
+        self._f.write(_b64(self._encrypted[:usable]))
+        self._encrypted = self._encrypted[usable:]
+
+    def close(self):
+        """Encrypt the padded rest and return the MAC."""
+        self._encrypt(pad(self._plain, AES.block_size), final=True)
+        return self._mac.digest()
+
+
+class BitwardenExport():
+    """Writes the converted entries to a Bitwarden JSON export, to be
+    imported with ``bw import bitwardenjson`` or the web vault, instead of
+    creating them through the bw CLI.
+
+    It has the methods of BitwardenClient the converter creates folders,
+    collections and entries with. Folders and collections have to be
+    created before the first entry. Entries are written as they come, so the
+    export is never held in memory, and the file only replaces ``path`` once
+    it is complete.
+
+    With a ``password`` the file is a password protected export like the
+    Bitwarden clients write it: the export is encrypted with AES-256-CBC and
+    HMAC-SHA256 keys derived from the password with PBKDF2-SHA256. Exports
+    can not contain attachments.
+    """
+
+    def __init__(self, path, orgId=None, password=None):
+        self._path = path
+        self._orgId = orgId
+        self._password = password
+        self._folders = {}
+        self._colls = {}
+        self._entries = 0
+        self._writing_entries = False
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        directory = os.path.dirname(os.path.abspath(self._path))
+        fd, self._tmp_path = tempfile.mkstemp(prefix=".kp2bw-export-", dir=directory)
+        self._file = os.fdopen(fd, "w", encoding="utf-8")
+
+        if self._password:
+            self._begin_encrypted()
+        else:
+            self._out = self._file
+        self._out.write('{"encrypted": false')
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        complete = False
+        try:
+            if exc_type is None:
+                self._finish()
+                complete = True
+        finally:
+            self._file.close()
+            if complete:
+                os.replace(self._tmp_path, self._path)
+            else:
+                os.remove(self._tmp_path)
+
+    @property
+    def entries(self):
+        return self._entries
+
+    def _encrypt_string(self, text):
+        iv = os.urandom(16)
+        buffer = io.StringIO()
+        writer = _EncryptingWriter(buffer, self._enc_key, self._mac_key, iv)
+        writer.write(text)
+        mac = writer.close()
+        return f"2.{_b64(iv)}|{buffer.getvalue()}|{_b64(mac)}"
+
+    def _begin_encrypted(self):
+        salt = _b64(os.urandom(16))
+        key = hashlib.pbkdf2_hmac("sha256", self._password.encode("utf-8"), salt.encode("utf-8"), EXPORT_KDF_ITERATIONS)
+        self._enc_key = _hkdf_expand(key, b"enc")
+        self._mac_key = _hkdf_expand(key, b"mac")
+
+        header = {
+            "encrypted": True,
+            "passwordProtected": True,
+            "salt": salt,
+            "kdfType": 0,
+            "kdfIterations": EXPORT_KDF_ITERATIONS,
+            "kdfMemory": None,
+            "kdfParallelism": None,
+            "encKeyValidation_DO_NOT_EDIT": self._encrypt_string(str(uuid.uuid4())),
+        }
+
+        # the plain export is streamed into the EncString of "data"
+        iv = os.urandom(16)
+        self._file.write(json.dumps(header)[:-1] + f', "data": "2.{_b64(iv)}|')
+        self._out = _EncryptingWriter(self._file, self._enc_key, self._mac_key, iv)
+
+    def _begin_entries(self):
+        if self._writing_entries:
+            return
+        self._writing_entries = True
+
+        folders = [{"id": folder_id, "name": folder} for folder, folder_id in self._folders.items()]
+        self._out.write(', "folders": ' + json.dumps(folders))
+        if self._orgId:
+            collections = [{"id": coll_id, "organizationId": self._orgId, "name": name, "externalId": None}
+                for name, coll_id in self._colls.items()]
+            self._out.write(', "collections": ' + json.dumps(collections))
+        self._out.write(', "items": [')
+
+    def _finish(self):
+        self._begin_entries()
+        self._out.write(']}')
+        if self._password:
+            mac = self._out.close()
+            self._file.write(f'|{_b64(mac)}"}}')
+
+    def has_folder(self, folder):
+        return folder in self._folders
+
+    def create_folders(self, folders, jobs=1):
+        with self._lock:
+            for folder in sorted(folder for folder in folders if folder):
+                if folder in self._folders:
+                    continue
+                if self._writing_entries:
+                    raise Exception(f"The folder {folder} has to be exported before the entries")
+                self._folders[folder] = str(uuid.uuid4())
+
+    def has_collection(self, collectionname):
+        return collectionname in self._colls
+
+    def create_org_collections(self, collectionnames, jobs=1):
+        with self._lock:
+            for name in sorted(name for name in collectionnames if name):
+                if name in self._colls:
+                    continue
+                if self._writing_entries:
+                    raise Exception(f"The collection {name} has to be exported before the entries")
+                self._colls[name] = str(uuid.uuid4())
+
+    def create_org_get_collection(self, collectionname):
+        if not collectionname:
+            return None
+
+        self.create_org_collections([collectionname])
+        return self._colls[collectionname]
+
+    def create_entry(self, folder, entry):
+        """Write an entry, return (ok, output) like BitwardenClient."""
+        entry["id"] = str(uuid.uuid4())
+        if folder:
+            self.create_folders([folder])
+            entry["folderId"] = self._folders[folder]
+
+        # an export lists the collections of an item
+        if isinstance(entry.get("collectionIds"), str):
+            entry["collectionIds"] = [entry["collectionIds"]]
+
+        output = json.dumps(entry)
+        with self._lock:
+            self._begin_entries()
+            self._out.write(("," if self._entries else "") + output)
+            self._entries += 1
+
+        return True, output
@@ -0,0 +1,51 @@
+class ItemRecord():
+    """A KeePass entry converted to a Bitwarden login item.
+
+    Only the values of the item are kept, in slots. The nested JSON
+    skeleton bw expects, with its null ``card``, ``identity`` and
+    ``secureNote`` members, is built by ``to_json`` right before the item is
+    sent. ``attachments`` is None or the list of FieldAttachment (long
+    fields) and BinaryAttachment handles to upload once the item exists;
+    their data is only read when they are uploaded.
+    """
+    __slots__ = ("kp_id", "mtime", "folder", "name", "notes", "uris", "username", "password", "totp",
+        "fields", "collection_ids", "firstlevel", "attachments")
+
+    def __init__(self, kp_id, folder, name, notes, url, username, password, totp, fields, collection_ids, firstlevel):
+        self.kp_id = kp_id
+        self.mtime = None
+        self.folder = folder
+        self.name = name
+        self.notes = notes
+        self.uris = [url] if url else []
+        self.username = username
+        self.password = password
+        self.totp = totp
+        # (name, value, type) of the custom fields
+        self.fields = fields
+        self.collection_ids = collection_ids
+        self.firstlevel = firstlevel
+        self.attachments = None
+
+    def to_json(self, organization_id):
+        """Return the item as the dict ``bw create item`` takes."""
+        return {
+            "organizationId": organization_id,
+            "collectionIds": self.collection_ids,
+            "folderId": None,
+            "type":1,
+            "name": self.name,
+            "notes": self.notes,
+            "favorite":False,
+            "fields":[{"name": name,"value": value,"type": field_type} for name, value, field_type in self.fields],
+            "login": {
+                "uris":[{"match": None,"uri": uri} for uri in self.uris],
+                "username": self.username,
+                "password": self.password,
+                "totp": self.totp,
+                "passwordRevisionDate": None
+            },
+            "secureNote": None,
+            "card": None,
+            "identity": None
+        }
@@ -0,0 +1,101 @@
+import threading
+
+
+class ItemIndex():
+    """Index of the Bitwarden items in the vault, keyed by (organization,
+    folder, name). Items of the personal vault have the organization None,
+    so jobs importing into different organizations do not see each other's
+    items as duplicates.
+
+    Every key maps to the list of (item_id, username, uri) records of the items
+    with that folder and name, so membership checks are O(1) and callers can
+    narrow a match down by username or uri. Items created during the current
+    run are added as well, but remembered separately: KeePass allows entries
+    with the same title in one folder, and those must not be skipped as
+    duplicates of each other on the first import.
+    """
+
+    def __init__(self):
+        self._items = {}
+        self._ids = set()
+        self._created_ids = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _first_uri(item):
+        login = item.get("login") or {}
+        uris = login.get("uris") or []
+        return uris[0].get("uri") if uris else None
+
+    @classmethod
+    def from_items(cls, items, folder_names, created_ids=()):
+        """Build the index from ``bw list items`` output, which lists the
+        items of the personal vault and of every organization. ``folder_names``
+        maps folder ids to folder names, items without a (known) folder are
+        stored under the folder None. ``created_ids`` are the ids of items
+        that were created in this run."""
+        index = cls()
+        for item in items:
+            index.add_item(folder_names.get(item.get("folderId")), item, item["id"] in created_ids)
+        return index
+
+    @classmethod
+    def from_records(cls, records):
+        """Rebuild an index saved with to_records."""
+        index = cls()
+        for folder, name, item_id, username, uri, created, org in records:
+            index.add(folder, name, item_id, username, uri, created, org)
+        return index
+
+    def to_records(self):
+        with self._lock:
+            return [[folder, name, item_id, username, uri, item_id in self._created_ids, org]
+                for (org, folder, name), records in self._items.items() for item_id, username, uri in records]
+
+    def add(self, folder, name, item_id, username=None, uri=None, created=False, org=None):
+        with self._lock:
+            self._items.setdefault((org, folder, name), []).append((item_id, username, uri))
+            self._ids.add(item_id)
+            if created:
+                self._created_ids.add(item_id)
+
+    def add_item(self, folder, item, created=False):
+        login = item.get("login") or {}
+        self.add(folder, item["name"], item.get("id"), login.get("username"), self._first_uri(item), created,
+            item.get("organizationId"))
+
+    def _records(self, folder, name, include_created, org):
+        records = self._items.get((org, folder, name), ())
+        if include_created:
+            return records
+        return [record for record in records if record[0] not in self._created_ids]
+
+    def contains(self, folder, name, username=None, uri=None, include_created=True, org=None):
+        return self.find(folder, name, username, uri, include_created, org) is not None
+
+    def find(self, folder, name, username=None, uri=None, include_created=True, org=None):
+        """Return the id of the first item of the organization ``org`` (None
+        for the personal vault) with the given folder and name (and username /
+        uri, when given), or None."""
+        for item_id, item_username, item_uri in self._records(folder, name, include_created, org):
+            if username is not None and (item_username or '') != username:
+                continue
+            if uri is not None and (item_uri or '') != uri:
+                continue
+            return item_id
+        return None
+
+    def settle_created(self):
+        """Count the items created so far as existing ones, as a fresh
+        listing of the vault would. Used between the jobs of a manifest run."""
+        with self._lock:
+            self._created_ids = set()
+
+    def has_id(self, item_id):
+        return item_id in self._ids
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._ids)
@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+import threading
+
+JOURNAL_VERSION = 1
+# records written between two fsyncs of the journal
+JOURNAL_FSYNC_EVERY = 100
+
+
+class Journal():
+    """Append-only checkpoint journal of an import, for ``-resume``.
+
+    One JSON record per line: a snapshot of the vault's folders, items
+    (folder, name and id only) and collections taken when the import
+    started, then every folder and collection created, every item created
+    (KeePass UUID -> item id), every attachment uploaded, and every entry
+    that was completed. Records are handed to the OS right away and fsynced
+    in batches, so a crashed process loses nothing and a power loss at most
+    the last batch.
+
+    Opening an existing journal replays it, so an interrupted import can
+    continue without listing the vault again and without touching the
+    entries it already finished.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._unsynced = 0
+
+        self.vault = None
+        self.items = {}
+        self.attachments = []
+        self.done = set()
+
+        if os.path.isfile(path):
+            self._replay()
+
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _replay(self):
+        folders = {}
+        colls = {}
+        end = 0
+        with open(self._path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # torn last line of a crashed run
+                    break
+                end += len(line)
+                complete_line = line.endswith(b"\n")
+
+                kind = record.get("t")
+                if kind == "start":
+                    if record.get("version") != JOURNAL_VERSION:
+                        raise Exception(f"Unsupported journal version in {self._path}")
+                    self.vault = record["vault"]
+                elif kind == "folder":
+                    folders[record["name"]] = record["id"]
+                elif kind == "collection":
+                    colls[record["name"]] = record["id"]
+                elif kind == "item":
+                    self.items[record["kp"]] = record
+                elif kind == "attachment":
+                    self.attachments.append(record)
+                elif kind == "done":
+                    self.done.add(record["kp"])
+
+        # cut a torn line off, the records of this run must start on a line of their own
+        with open(self._path, "r+b") as f:
+            f.truncate(end)
+            if end and not complete_line:
+                f.seek(end)
+                f.write(b"\n")
+
+        if self.vault is not None:
+            self.vault["folders"].update(folders)
+            if self.vault.get("colls") is not None:
+                self.vault["colls"].update(colls)
+            logging.info(f"Resuming from {self._path}: {len(self.done)} entries already done")
+
+    @property
+    def resuming(self):
+        return self.vault is not None
+
+    def _write(self, record, sync=False):
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            self._unsynced += 1
+            if sync or self._unsynced >= JOURNAL_FSYNC_EVERY:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+
+    def start(self, vault):
+        """Record the vault state the import starts from."""
+        self.vault = vault
+        self._write({"t": "start", "version": JOURNAL_VERSION, "vault": vault}, sync=True)
+
+    def folder(self, name, folder_id):
+        self._write({"t": "folder", "name": name, "id": folder_id})
+
+    def collection(self, name, coll_id):
+        self._write({"t": "collection", "name": name, "id": coll_id})
+
+    def item(self, kp_id, item_id, folder, name):
+        record = {"t": "item", "kp": kp_id, "id": item_id, "folder": folder, "name": name}
+        with self._lock:
+            self.items[kp_id] = record
+        self._write(record)
+
+    def item_id(self, kp_id):
+        record = self.items.get(kp_id)
+        return record["id"] if record else None
+
+    def attachment(self, item_id, sha256, filename, attachment_id):
+        self._write({"t": "attachment", "item": item_id, "sha256": sha256, "name": filename, "id": attachment_id})
+
+    def entry_done(self, kp_id):
+        with self._lock:
+            self.done.add(kp_id)
+        self._write({"t": "done", "kp": kp_id})
+
+    def close(self, remove=False):
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+        if remove:
+            os.remove(self._path)
@@ -0,0 +1,58 @@
+import json
+
+# characters read from the stream at a time
+READ_SIZE = 1 << 16
+
+
+def iter_json_array(stream, read_size=READ_SIZE):
+    """Yield the elements of the JSON array read from the text ``stream``.
+
+    Every element is decoded as soon as it is complete, so a large listing
+    is never held as one string and its elements can be consumed while the
+    producer is still writing.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    started = False
+    eof = False
+
+    while True:
+        # skip the separators between elements
+        while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ","):
+            pos += 1
+
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError(f"Expected a JSON array, got: {buffer[pos:pos + 100]}")
+                started = True
+                pos += 1
+                continue
+
+            if buffer[pos] == "]":
+                return
+
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # incomplete element, read on
+                if eof:
+                    raise
+            else:
+                # a number cut off by the end of the buffer may go on in the next chunk
+                if eof or (end < len(buffer) and (buffer[end] in ",]" or buffer[end].isspace())):
+                    yield element
+                    pos = end
+                    continue
+        elif eof:
+            raise ValueError("Unexpected end of the JSON array")
+
+        # drop what was decoded and read more
+        buffer = buffer[pos:]
+        pos = 0
+        chunk = stream.read(read_size)
+        if chunk:
+            buffer += chunk
+        else:
+            eof = True
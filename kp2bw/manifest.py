@@ -0,0 +1,133 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from .bitwardenclient import BitwardenClient
+from .convert import Converter
+from .scheduler import RequestScheduler
+from .snapshot import VaultSnapshot
+from .stats import RunStats
+
+# keys of a manifest job, only kdbx is required
+MANIFEST_KEYS = ("kdbx", "kppw", "keyfile", "org", "collection", "import_tags", "import_groups", "import_titles", "state")
+# filters a job may set, they override the ones of the command line
+MANIFEST_FILTERS = ("import_tags", "import_groups", "import_titles")
+
+
+def read_manifest(path):
+    """Read a manifest: a JSON list of jobs, one object per KeePass db with
+    the keys of MANIFEST_KEYS. ``org`` and ``collection`` are the
+    -bworg and -bwcoll of the job, ``state`` its -state file."""
+    with open(path, "r", encoding="utf-8") as f:
+        jobs = json.load(f)
+
+    if not isinstance(jobs, list) or not jobs:
+        raise Exception(f"The manifest {path} must be a non-empty JSON list of jobs")
+
+    for number, job in enumerate(jobs, 1):
+        if not isinstance(job, dict) or not job.get("kdbx"):
+            raise Exception(f"Job {number} of the manifest {path} has no kdbx")
+        unknown = set(job) - set(MANIFEST_KEYS)
+        if unknown:
+            raise Exception(f"Job {number} of the manifest {path} has unknown keys: {', '.join(sorted(unknown))}")
+        if job.get("collection") and not job.get("org"):
+            raise Exception(f"Job {number} of the manifest {path} has a collection but no org")
+        for key in MANIFEST_FILTERS:
+            if job.get(key) is not None and not isinstance(job[key], list):
+                raise Exception(f"The {key} of job {number} of the manifest {path} must be a list")
+
+    return jobs
+
+
+class ManifestRunner():
+    """Converts the KeePass dbs of a manifest one after the other.
+
+    All jobs share one BitwardenClient, so the vault is unlocked, synced and
+    listed once. The folder and item indexes carry over from job to job and
+    the collections of every organization are listed once. While a job
+    uploads, the db of the next job is decrypted and its REFs resolved in
+    the background. A failed job is logged and the others still run.
+    """
+
+    def __init__(self, manifest, bitwarden_password, keepass_password=None, bitwarden_serve=False, retries=5, timeout=120,
+            stats_file_path=None, snapshot_file_path=None, snapshot_ttl=60, **settings):
+        self._manifest = manifest
+        self._bitwarden_password = bitwarden_password
+        self._keepass_password = keepass_password
+        self._bitwarden_serve = bitwarden_serve
+        self._retries = retries
+        self._timeout = timeout
+        self._stats_file_path = stats_file_path
+        self._snapshot = VaultSnapshot(snapshot_file_path, bitwarden_password, snapshot_ttl * 60) if snapshot_file_path else None
+        # Converter settings shared by all jobs (path2name, jobs, batch_size, ...)
+        self._settings = settings
+        self._stats = RunStats()
+
+    def _converter(self, job, bw):
+        settings = dict(self._settings)
+        settings.setdefault("import_tags", None)
+        settings.update((key, job[key]) for key in MANIFEST_FILTERS if key in job)
+        return Converter(
+            keepass_file_path=job["kdbx"],
+            keepass_password=job.get("kppw", self._keepass_password),
+            keepass_keyfile_path=job.get("keyfile"),
+            bitwarden_password=None,
+            bitwarden_organization_id=job.get("org"),
+            bitwarden_coll_id=job.get("collection"),
+            state_file_path=job.get("state"),
+            bitwarden_client=bw,
+            stats=self._stats,
+            **settings)
+
+    def _describe(self, number, job):
+        return f"[job {number} of {len(self._manifest)}] {job['kdbx']}"
+
+    def run(self):
+        logging.info(f"Connecting and reading existing folders and entries")
+        scheduler = RequestScheduler(max_concurrency=self._settings.get("jobs", 1), max_retries=self._retries,
+            timeout=self._timeout, stats=self._stats)
+        with self._stats.phase("connect"):
+            bw = BitwardenClient(self._bitwarden_password, None, serve=self._bitwarden_serve, stats=self._stats, scheduler=scheduler,
+                snapshot=self._snapshot)
+
+        failed = []
+        try:
+            with bw, ThreadPoolExecutor(max_workers=1) as loader:
+                converter = self._converter(self._manifest[0], bw)
+                loading = loader.submit(converter.load)
+                for number, job in enumerate(self._manifest, 1):
+                    try:
+                        loading.result()
+                        loaded = True
+                    except Exception as e:
+                        logging.error(f"!! ERROR: {self._describe(number, job)}: could not load the db: {e} !!")
+                        failed.append(job["kdbx"])
+                        loaded = False
+
+                    # decrypt the next db while this one uploads
+                    current = converter
+                    if number < len(self._manifest):
+                        converter = self._converter(self._manifest[number], bw)
+                        loading = loader.submit(converter.load)
+
+                    if not loaded:
+                        continue
+
+                    target = f"organization {job['org']}" if job.get("org") else "the personal vault"
+                    logging.info(f"{self._describe(number, job)}: converting into {target}")
+                    try:
+                        current.upload()
+                    except Exception as e:
+                        logging.error(f"!! ERROR: {self._describe(number, job)} failed: {e} !!")
+                        failed.append(job["kdbx"])
+        finally:
+            if self._stats_file_path:
+                self._stats.write(self._stats_file_path)
+                logging.info(f"Wrote run statistics to {self._stats_file_path}")
+
+        if scheduler.retries:
+            logging.info(f"Retried {scheduler.retries} bw calls, the server throttled {scheduler.throttled} of them")
+
+        if failed:
+            raise Exception(f"{len(failed)} of {len(self._manifest)} manifest jobs failed: {', '.join(failed)}")
+        logging.info(f"Converted all {len(self._manifest)} KeePass dbs of the manifest")
@@ -0,0 +1,86 @@
+import json
+import threading
+
+# what an import would do with an entry
+CREATE = "create"
+UPDATE = "update"
+COMPLETE = "complete"
+SKIP = "skip"
+UNCHANGED = "unchanged"
+ACTIONS = (CREATE, UPDATE, COMPLETE, SKIP, UNCHANGED)
+
+
+class ImportPlan():
+    """The changes an import would make to the vault, computed by ``-plan``.
+
+    Lists every selected entry with the action the import would take (create,
+    update, complete the attachments of an item created by an interrupted
+    run, skip as already existing, or leave unchanged since the last sync),
+    the folders and collections that would be created and the attachments
+    that would be uploaded, and writes them as JSON. No secrets are written,
+    entries are listed by KeePass UUID, folder and name.
+
+    The summary estimates the number of bw write calls, which together with
+    the latencies from ``-stats`` gives the run time of the import.
+    """
+
+    def __init__(self, batch_size=None):
+        self._batch_size = batch_size
+        self._items = []
+        self._folders = set()
+        self._collections = set()
+        self._lock = threading.Lock()
+
+    def item(self, action, kp_id, folder, name, collection=None, attachments=()):
+        """Record an entry. ``attachments`` are (filename, size) pairs of the
+        files that would be uploaded."""
+        with self._lock:
+            self._items.append({
+                "action": action,
+                "kp_id": kp_id,
+                "folder": folder,
+                "name": name,
+                "collection": collection,
+                "attachments": [{"name": filename, "size": size} for filename, size in attachments],
+            })
+
+    def folder(self, name):
+        with self._lock:
+            self._folders.add(name)
+
+    def collection(self, name):
+        with self._lock:
+            self._collections.add(name)
+
+    def summary(self):
+        with self._lock:
+            counts = {action: 0 for action in ACTIONS}
+            attachments = 0
+            attachment_bytes = 0
+            for item in self._items:
+                counts[item["action"]] += 1
+                attachments += len(item["attachments"])
+                attachment_bytes += sum(attachment["size"] for attachment in item["attachments"])
+
+            # with -batch new items go in with one bw import per chunk
+            creates = counts[CREATE]
+            if self._batch_size:
+                creates = -(-creates // self._batch_size)
+
+            return dict(counts, folders=len(self._folders), collections=len(self._collections),
+                attachments=attachments, attachment_bytes=attachment_bytes,
+                bw_writes=len(self._folders) + len(self._collections) + creates + counts[UPDATE] + attachments)
+
+    def to_dict(self):
+        summary = self.summary()
+        with self._lock:
+            return {
+                "summary": summary,
+                "folders": sorted(self._folders),
+                "collections": sorted(self._collections),
+                "items": list(self._items),
+            }
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
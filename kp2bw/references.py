@@ -0,0 +1,95 @@
+import re
+from collections import deque
+
+KP_REF_IDENTIFIER = "{REF:"
+# {REF:<field>@<lookup mode>:<search text>}, e.g. {REF:U@I:CFC0141068E83547BCEEAF0C1ADABAE0}
+KP_REF_PATTERN = re.compile(r"\{REF:([TUPANI])@([TUPANI]):([^}]*)\}", re.IGNORECASE)
+
+# REF field / lookup mode -> String key of the entry
+KP_REF_KEYS = {
+    "T": "Title",
+    "U": "UserName",
+    "P": "Password",
+    "A": "URL",
+    "N": "Notes",
+}
+# String key -> pykeepass Entry attribute, for the fields that may contain REFs
+KP_REF_MEMBERS = {
+    "Title": "title",
+    "UserName": "username",
+    "Password": "password",
+    "URL": "url",
+    "Notes": "notes",
+}
+
+
+def find_references(strings):
+    """Return {member: [(field, lookup_mode, search), ...]} for the fields of
+    an entry (a read_strings dict) that contain REFs."""
+    references = {}
+    for key, member in KP_REF_MEMBERS.items():
+        value = strings.get(key)
+        if value and KP_REF_IDENTIFIER in value:
+            refs = [(field.upper(), mode.upper(), search) for field, mode, search in KP_REF_PATTERN.findall(value)]
+            if refs:
+                references[member] = refs
+    return references
+
+
+class ReferenceIndex():
+    """Hash indexes to find the target of a REF, built in one pass over the
+    entries: kp_id -> entry for ``@I`` lookups, and value -> kp_id for each
+    other lookup mode in use. Like KeePass, value lookups ignore case and the
+    first matching entry wins."""
+
+    def __init__(self, lookup_modes):
+        self._entries = {}
+        self._values = {mode: {} for mode in lookup_modes if mode != "I"}
+
+    def add(self, kp_id, entry, strings):
+        self._entries[kp_id] = entry
+        for mode, values in self._values.items():
+            value = strings.get(KP_REF_KEYS[mode])
+            if value:
+                values.setdefault(value.casefold(), kp_id)
+
+    def lookup(self, lookup_mode, search):
+        """Return the kp_id of the entry a REF points to, or None."""
+        if lookup_mode == "I":
+            kp_id = search.upper()
+            return kp_id if kp_id in self._entries else None
+        return self._values[lookup_mode].get(search.casefold())
+
+    def entry(self, kp_id):
+        return self._entries[kp_id]
+
+    def value(self, kp_id, field):
+        """Return the current value of a field of an indexed entry."""
+        if field == "I":
+            return kp_id
+        return getattr(self._entries[kp_id], KP_REF_MEMBERS[KP_REF_KEYS[field]]) or ''
+
+
+def topological_order(dependencies):
+    """Order the nodes of {node: set of nodes it depends on} so that every
+    node comes after its dependencies. Returns (order, cyclic): nodes on or
+    behind a dependency cycle can not be ordered and are returned in cyclic."""
+    dependents = {node: [] for node in dependencies}
+    missing = {}
+    for node, required in dependencies.items():
+        missing[node] = len(required)
+        for dependency in required:
+            dependents[dependency].append(node)
+
+    ready = deque(node for node, count in missing.items() if count == 0)
+    order = []
+    while ready:
+        node = ready.popleft()
+        order.append(node)
+        for dependent in dependents[node]:
+            missing[dependent] -= 1
+            if missing[dependent] == 0:
+                ready.append(dependent)
+
+    ordered = set(order)
+    return order, [node for node in dependencies if node not in ordered]
@@ -0,0 +1,173 @@
+import logging
+import random
+import re
+import threading
+import time
+
+# failure classes of a bw call
+OK = "ok"
+THROTTLED = "throttled"
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+# HTTP status of a failed call: bw serve answers "error: <status> <message>",
+# the CLI names it in messages like "Response status code does not indicate success: 429"
+STATUS_PATTERN = re.compile(r"^error: (\d{3})\b|\bstatus(?: code)?(?: does not indicate success)?:? (\d{3})\b")
+THROTTLED_STATUSES = (429, 503)
+TRANSIENT_STATUSES = (500, 502, 504)
+
+# the server refused the request without processing it, safe to retry any command
+THROTTLED_PATTERN = re.compile(r"\b(too many requests|rate limit(ed)?|service unavailable|econnrefused|connection refused)\b")
+# the request may or may not have been processed
+TRANSIENT_PATTERN = re.compile(r"\b(internal server error|bad gateway|gateway timeout|timeout|timed out|econnreset|etimedout"
+    r"|socket hang up|fetch failed|network ?error|network request failed|connection reset|remote end closed|broken pipe)\b")
+
+# commands that can be repeated without creating anything twice
+IDEMPOTENT_COMMANDS = ("list", "get", "sync", "edit", "delete", "unlock", "status")
+
+# latency above this multiple of the best seen average counts as overload
+LATENCY_OVERLOAD_FACTOR = 3.0
+LATENCY_SMOOTHING = 0.2
+
+
+def classify(ok, output):
+    """Classify a bw call by its status, if the output has one, otherwise
+    by its message. Digits elsewhere, as in ids, are not a status."""
+    if ok:
+        return OK
+
+    text = output.strip().lower()
+    match = STATUS_PATTERN.search(text)
+    if match:
+        status = int(match.group(1) or match.group(2))
+        if status in THROTTLED_STATUSES:
+            return THROTTLED
+        if status in TRANSIENT_STATUSES:
+            return TRANSIENT
+    if THROTTLED_PATTERN.search(text):
+        return THROTTLED
+    if TRANSIENT_PATTERN.search(text):
+        return TRANSIENT
+    return PERMANENT
+
+
+class RequestScheduler():
+    """Runs bw calls with retries and an adaptive concurrency limit.
+
+    Failed calls are classified by their output. Throttled calls (429, 503,
+    refused connections) were not processed by the server and are retried
+    for every command; other transient failures (timeouts, resets, 5xx) are
+    retried only for idempotent commands, a ``create`` that timed out may
+    have succeeded. Retries wait a jittered exponential backoff.
+
+    The number of calls in flight starts at ``max_concurrency`` and follows
+    AIMD: it is halved when the server throttles, lowered by one when the
+    average latency of a command type rises well above the best seen, and
+    raised by one after a full window of healthy calls. Throttling also
+    pauses all callers for the backoff delay.
+    """
+
+    def __init__(self, max_concurrency=1, max_retries=5, base_delay=1.0, max_delay=60.0, timeout=120, stats=None):
+        self.timeout = timeout
+        self._max_concurrency = max(1, max_concurrency)
+        self._max_retries = max_retries
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._stats = stats
+
+        self._cond = threading.Condition()
+        self._limit = self._max_concurrency
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._healthy = 0
+        # command type -> [average latency, best average latency]
+        self._latency = {}
+
+        self.retries = 0
+        self.throttled = 0
+
+    @property
+    def limit(self):
+        return self._limit
+
+    def _acquire(self):
+        with self._cond:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0 and self._in_flight < self._limit:
+                    self._in_flight += 1
+                    return
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _set_limit(self, limit, reason):
+        limit = max(1, min(self._max_concurrency, limit))
+        if limit != self._limit:
+            logging.info(f"-- {reason}, {limit} bw calls in parallel now")
+            self._limit = limit
+            self._cond.notify_all()
+
+    def _observe(self, command, outcome, seconds, delay):
+        with self._cond:
+            if outcome == THROTTLED:
+                self.throttled += 1
+                self._healthy = 0
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                self._set_limit(self._limit // 2, "Throttled by the server")
+                return
+
+            if outcome != OK:
+                self._healthy = 0
+                return
+
+            latency = self._latency.setdefault(command, [seconds, seconds])
+            latency[0] += LATENCY_SMOOTHING * (seconds - latency[0])
+            latency[1] = min(latency[1], latency[0])
+
+            if latency[0] > LATENCY_OVERLOAD_FACTOR * latency[1] and self._limit > 1:
+                self._healthy = 0
+                # start over from the new level, so the limit drops by one per window
+                latency[1] = latency[0]
+                self._set_limit(self._limit - 1, f"Latency of {command} rising")
+                return
+
+            self._healthy += 1
+            if self._healthy >= self._limit and self._limit < self._max_concurrency:
+                self._healthy = 0
+                self._set_limit(self._limit + 1, "Server keeping up")
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self._max_delay, self._base_delay * 2 ** attempt))
+
+    def run(self, command, call):
+        """Run ``call`` (returning ``(ok, output)``) for the bw command type
+        ``command`` and return ``(ok, output)`` of the last attempt."""
+        idempotent = command.split(" ")[0] in IDEMPOTENT_COMMANDS
+        attempt = 0
+        while True:
+            self._acquire()
+            start = time.monotonic()
+            try:
+                ok, output = call()
+            finally:
+                self._release()
+
+            outcome = classify(ok, output)
+            delay = self._backoff(attempt)
+            self._observe(command, outcome, time.monotonic() - start, delay)
+
+            retry = outcome == THROTTLED or (outcome == TRANSIENT and idempotent)
+            if not retry or attempt >= self._max_retries:
+                return ok, output
+
+            attempt += 1
+            with self._cond:
+                self.retries += 1
+            if self._stats:
+                self._stats.record_retry(command, outcome)
+            logging.warning(f"!! bw {command} failed ({outcome}): {output.strip()[:200]} - retry {attempt} of {self._max_retries} in {delay:.1f}s !!")
+            time.sleep(delay)
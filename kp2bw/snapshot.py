@@ -0,0 +1,94 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import zlib
+
+from Cryptodome.Cipher import AES
+
+SNAPSHOT_MAGIC = b"KP2BWSNAP1"
+SNAPSHOT_VERSION = 2
+# PBKDF2-HMAC-SHA256 rounds deriving the snapshot key from the master password
+SNAPSHOT_KDF_ROUNDS = 600000
+
+
+class VaultSnapshot():
+    """Encrypted local copy of the folder, collection and item indexes of a
+    vault, for ``-snapshot``.
+
+    Saved when a client closes, with the items it created, and used by the
+    next run instead of ``bw list items``, which decrypts the whole vault. A
+    snapshot is used only if it belongs to the same account and server, is
+    younger than ``ttl`` seconds and the folders of the vault (a cheap
+    listing) are still the ones it recorded. bw exposes no revision date of
+    the vault, so changes other clients make to items within the ttl are
+    not seen.
+
+    The file is AES-GCM encrypted with a key derived from the Bitwarden
+    master password, it holds item names, usernames and first URIs.
+    """
+
+    def __init__(self, path, password, ttl=3600):
+        self._path = path
+        self._password = password.encode("utf-8")
+        self._ttl = ttl
+
+    def _key(self, salt):
+        return hashlib.pbkdf2_hmac("sha256", self._password, salt, SNAPSHOT_KDF_ROUNDS)
+
+    def load(self, account):
+        """Return the vault state saved for ``account``, or None if there is
+        no usable snapshot."""
+        if not os.path.isfile(self._path):
+            return None
+
+        with open(self._path, "rb") as f:
+            raw = f.read()
+
+        if not raw.startswith(SNAPSHOT_MAGIC):
+            logging.warning(f"!! {self._path} is not a kp2bw vault snapshot, ignoring it !!")
+            return None
+
+        salt, nonce, tag = raw[10:26], raw[26:42], raw[42:58]
+        cipher = AES.new(self._key(salt), AES.MODE_GCM, nonce=nonce)
+        try:
+            snapshot = json.loads(zlib.decompress(cipher.decrypt_and_verify(raw[58:], tag)))
+        except ValueError:
+            logging.warning(f"!! Could not decrypt the vault snapshot {self._path}, listing the vault instead !!")
+            return None
+
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            logging.info(f"The vault snapshot {self._path} was written by another version of kp2bw, listing the vault instead")
+            return None
+        if snapshot.get("account") != account:
+            logging.info(f"The vault snapshot {self._path} belongs to another account, listing the vault instead")
+            return None
+
+        age = time.time() - snapshot["saved"]
+        if age > self._ttl:
+            logging.info(f"The vault snapshot {self._path} is {age / 60:.0f} minutes old, listing the vault instead")
+            return None
+
+        return snapshot["vault"]
+
+    def save(self, account, vault):
+        snapshot = {"version": SNAPSHOT_VERSION, "account": account, "saved": time.time(), "vault": vault}
+        salt = os.urandom(16)
+        nonce = os.urandom(16)
+        cipher = AES.new(self._key(salt), AES.MODE_GCM, nonce=nonce)
+        data, tag = cipher.encrypt_and_digest(zlib.compress(json.dumps(snapshot).encode("utf-8")))
+
+        # replace the old snapshot only once the new one is complete
+        directory = os.path.dirname(os.path.abspath(self._path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".kp2bw-snapshot-", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(SNAPSHOT_MAGIC + salt + nonce + tag + data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
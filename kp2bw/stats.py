@@ -0,0 +1,102 @@
+import heapq
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# bw options that do not take a value
+FLAG_OPTIONS = ("--raw", "--version", "--pretty", "--nointeraction", "--quiet")
+
+
+class RunStats():
+    """Timing and volume figures of one conversion run.
+
+    Collects the wall time per phase, the latency of every bw call grouped by
+    command type (``create item``, ``list items``, ...), the bytes sent to
+    Bitwarden and the slowest entries, and writes them as a JSON summary.
+    """
+
+    def __init__(self, slowest=10):
+        self._slowest = slowest
+        self._phases = {}
+        self._calls = {}
+        self._entries = []
+        self._counters = {}
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase_time(name, time.perf_counter() - start)
+
+    def add_phase_time(self, name, seconds):
+        with self._lock:
+            self._phases[name] = self._phases.get(name, 0.0) + seconds
+
+    @staticmethod
+    def command_type(args):
+        """``["bw", "create", "item", "--session", key]`` -> ``"create item"``"""
+        words = []
+        rest = iter(args[1:])
+        for arg in rest:
+            if arg.startswith("--"):
+                # skip the option's value too, it may be the session key
+                if arg not in FLAG_OPTIONS:
+                    next(rest, None)
+                continue
+            words.append(arg)
+            if len(words) == 2:
+                break
+        return " ".join(words) if words else " ".join(args[1:2])
+
+    def _call(self, command):
+        return self._calls.setdefault(command, {"count": 0, "total_s": 0.0, "max_s": 0.0, "bytes_sent": 0, "retries": 0})
+
+    def record_call(self, command, seconds, bytes_sent=0):
+        with self._lock:
+            call = self._call(command)
+            call["count"] += 1
+            call["total_s"] += seconds
+            call["max_s"] = max(call["max_s"], seconds)
+            call["bytes_sent"] += bytes_sent
+
+    def record_retry(self, command, reason):
+        with self._lock:
+            self._call(command)["retries"] += 1
+            self._counters["retries." + reason] = self._counters.get("retries." + reason, 0) + 1
+
+    def record_entry(self, kp_id, name, seconds):
+        with self._lock:
+            item = (seconds, kp_id, name)
+            if len(self._entries) < self._slowest:
+                heapq.heappush(self._entries, item)
+            elif item > self._entries[0]:
+                heapq.heapreplace(self._entries, item)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def to_dict(self):
+        with self._lock:
+            calls = {}
+            for command, call in sorted(self._calls.items()):
+                calls[command] = dict(call, mean_s=call["total_s"] / call["count"])
+
+            return {
+                "wall_time_s": time.perf_counter() - self._started,
+                "phases_s": dict(self._phases),
+                "calls": calls,
+                "bytes_sent": sum(call["bytes_sent"] for call in self._calls.values()),
+                "counters": dict(self._counters),
+                "slowest_entries": [{"kp_id": kp_id, "name": name, "seconds": seconds}
+                    for seconds, kp_id, name in sorted(self._entries, reverse=True)],
+            }
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
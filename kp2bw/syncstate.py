@@ -0,0 +1,70 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from .attachments import UploadCache
+
+STATE_FILE_VERSION = 1
+
+
+class SyncState():
+    """Local state of an incremental sync.
+
+    Maps the KeePass UUID of every imported entry to the id of its Bitwarden
+    item, the entry's modification time and content hashes of the item and
+    its attachments. Entries whose mtime did not change since the last run
+    can be skipped without building their item at all. The cache of uploaded
+    attachments is stored alongside.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._entries = {}
+        self.uploads = UploadCache()
+        self._lock = threading.Lock()
+
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+
+            if data.get("version") != STATE_FILE_VERSION:
+                raise Exception(f"Unsupported sync state file version in {path}")
+
+            self._entries = data.get("entries", {})
+            self.uploads = UploadCache(data.get("uploads"))
+            logging.info(f"Loaded sync state of {len(self._entries)} entries from {path}")
+
+    def get(self, kp_id):
+        return self._entries.get(kp_id)
+
+    def is_unchanged(self, kp_id, mtime):
+        entry = self._entries.get(kp_id)
+        return entry is not None and mtime is not None and entry["mtime"] == mtime
+
+    def record(self, kp_id, item_id, mtime, content_hash, attachments_hash):
+        with self._lock:
+            self._entries[kp_id] = {
+                "id": item_id,
+                "mtime": mtime,
+                "hash": content_hash,
+                "attachments": attachments_hash,
+            }
+
+    def save(self):
+        """Write the state atomically, a crash never leaves a torn file."""
+        with self._lock:
+            data = json.dumps({"version": STATE_FILE_VERSION, "entries": self._entries, "uploads": self.uploads.to_dict()})
+
+        directory = os.path.dirname(os.path.abspath(self._path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".kp2bw-state-", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
@@ -0,0 +1,150 @@
+import json
+import threading
+import unittest
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from kp2bw.bwserve import BitwardenServe
+
+
+class _Vault():
+    def __init__(self):
+        self.items = {}
+        self.requests = []
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Stand-in for the routes of ``bw serve`` kp2bw uses. Anything else is
+    answered like the real server answers unknown objects."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def vault(self):
+        return self.server.vault
+
+    def _reply(self, data, status=200, message=None):
+        body = json.dumps({"success": status < 400, "data": data, "message": message}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _route(self):
+        url = urlparse(self.path)
+        self.vault.requests.append((self.command, url.path))
+        return url.path.strip("/").split("/"), {key: values[0] for key, values in parse_qs(url.query).items()}
+
+    def do_GET(self):
+        path, query = self._route()
+        if path == ["list", "object", "items"]:
+            items = [item for item in self.vault.items.values() if query.get("search", "") in item["name"]]
+            return self._reply({"object": "list", "data": items})
+        return self._reply(None, 404, "Not found.")
+
+    def do_POST(self):
+        path, query = self._route()
+        body = self._body()
+        if path == ["attachment"]:
+            message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8") + body)
+            parts = [part for part in message.iter_parts() if part.get_param("name", header="content-disposition") == "file"]
+            if not parts or "itemid" not in query:
+                return self._reply(None, 400, "A file and an item id are required.")
+            item = self.vault.items[query["itemid"]]
+            item["attachments"].append({"id": str(uuid.uuid4()), "fileName": parts[0].get_filename(),
+                "size": str(len(parts[0].get_payload(decode=True)))})
+            return self._reply(item)
+        if path == ["object", "item"]:
+            item = dict(json.loads(body), id=str(uuid.uuid4()), attachments=[])
+            self.vault.items[item["id"]] = item
+            return self._reply(item)
+        return self._reply(None, 400, "Invalid object.")
+
+    def do_PUT(self):
+        path, query = self._route()
+        if len(path) == 3 and path[:2] == ["object", "item"] and path[2] in self.vault.items:
+            item = dict(json.loads(self._body()), id=path[2], attachments=self.vault.items[path[2]]["attachments"])
+            self.vault.items[path[2]] = item
+            return self._reply(item)
+        return self._reply(None, 404, "Not found.")
+
+    def do_DELETE(self):
+        path, query = self._route()
+        if len(path) == 3 and path[:2] == ["object", "attachment"] and query.get("itemid") in self.vault.items:
+            item = self.vault.items[query["itemid"]]
+            item["attachments"] = [attachment for attachment in item["attachments"] if attachment["id"] != path[2]]
+            return self._reply(None)
+        return self._reply(None, 404, "Not found.")
+
+
+class BitwardenServeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.httpd.vault = _Vault()
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.serve = BitwardenServe("SESSION", port=self.httpd.server_address[1], timeout=10)
+
+    def tearDown(self):
+        self.serve.stop()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def exec(self, *args, stdin_data=None):
+        output = self.serve.exec(["bw", *args, "--session", "SESSION"], stdin_data)
+        self.assertFalse(output.startswith("error: "), output)
+        return json.loads(output) if output else None
+
+    def create_item(self, name):
+        return self.exec("create", "item", stdin_data=json.dumps({"name": name, "type": 1}).encode("utf-8"))
+
+    def test_list_items(self):
+        self.create_item("alpha")
+        self.create_item("beta")
+        self.assertEqual(["alpha", "beta"], sorted(item["name"] for item in self.exec("list", "items")))
+        self.assertEqual(["beta"], [item["name"] for item in self.exec("list", "items", "--search", "bet")])
+
+    def test_create_and_edit_item(self):
+        item = self.create_item("alpha")
+        self.assertEqual("alpha", item["name"])
+
+        edited = self.exec("edit", "item", item["id"], stdin_data=json.dumps({"name": "renamed", "type": 1}).encode("utf-8"))
+        self.assertEqual((item["id"], "renamed"), (edited["id"], edited["name"]))
+        self.assertEqual("renamed", self.httpd.vault.items[item["id"]]["name"])
+
+    def test_attachment_upload(self):
+        item = self.create_item("alpha")
+        for filename in ("my cert.pem", 'quote " and \\ backslash.txt', "zertifikat-ä.pem"):
+            uploaded = self.exec("create", "attachment", "--file", filename, "--itemid", item["id"], stdin_data=b"content")
+            self.assertEqual(filename, uploaded["attachments"][-1]["fileName"])
+            self.assertEqual("7", uploaded["attachments"][-1]["size"])
+
+        self.assertIn(("POST", "/attachment"), self.httpd.vault.requests)
+
+    def test_delete_attachment(self):
+        item = self.create_item("alpha")
+        uploaded = self.exec("create", "attachment", "--file", "a.txt", "--itemid", item["id"], stdin_data=b"content")
+        attachment_id = uploaded["attachments"][0]["id"]
+
+        self.exec("delete", "attachment", attachment_id, "--itemid", item["id"])
+        self.assertEqual([], self.httpd.vault.items[item["id"]]["attachments"])
+
+    def test_error_keeps_status(self):
+        output = self.serve.exec(["bw", "edit", "item", "missing", "--session", "SESSION"], b"{}")
+        self.assertEqual("error: 404 Not found.", output)
+
+    def test_unsupported_command_falls_back(self):
+        self.assertIsNone(self.serve.exec(["bw", "import", "bitwardenjson", "file.json", "--session", "SESSION"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
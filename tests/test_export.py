@@ -0,0 +1,114 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from Cryptodome.Cipher import AES
+from Cryptodome.Util.Padding import unpad
+
+from kp2bw.export import BitwardenExport
+
+
+def _decrypt(enc_string, enc_key, mac_key):
+    """Decrypt an EncString of type 2 the way the Bitwarden clients do."""
+    kind, rest = enc_string.split(".", 1)
+    iv, data, mac = (base64.b64decode(part) for part in rest.split("|"))
+    if kind != "2" or not hmac.compare_digest(mac, hmac.new(mac_key, iv + data, hashlib.sha256).digest()):
+        raise ValueError("Invalid EncString")
+    return unpad(AES.new(enc_key, AES.MODE_CBC, iv=iv).decrypt(data), AES.block_size).decode("utf-8")
+
+
+def _open_protected_export(document, password):
+    key = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), document["salt"].encode("utf-8"), document["kdfIterations"])
+    enc_key = hmac.new(key, b"enc\x01", hashlib.sha256).digest()
+    mac_key = hmac.new(key, b"mac\x01", hashlib.sha256).digest()
+    _decrypt(document["encKeyValidation_DO_NOT_EDIT"], enc_key, mac_key)
+    return json.loads(_decrypt(document["data"], enc_key, mac_key))
+
+
+def _entry(name, notes=""):
+    return {"type": 1, "name": name, "notes": notes, "login": {"username": "user", "password": "pw", "uris": []}}
+
+
+class BitwardenExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory(prefix="kp2bw-test-")
+        self.path = os.path.join(self.tmp.name, "export.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, entries, **kwargs):
+        with BitwardenExport(self.path, **kwargs) as export:
+            export.create_folders({folder for folder, entry in entries})
+            for folder, entry in entries:
+                self.assertTrue(export.create_entry(folder, entry)[0])
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_plain_export(self):
+        document = self.write([("Team A", _entry("a")), (None, _entry("b"))])
+
+        self.assertFalse(document["encrypted"])
+        self.assertEqual(["Team A"], [folder["name"] for folder in document["folders"]])
+        self.assertEqual(["a", "b"], [item["name"] for item in document["items"]])
+        self.assertEqual(document["folders"][0]["id"], document["items"][0]["folderId"])
+        self.assertNotIn("collections", document)
+
+    def test_collections(self):
+        with BitwardenExport(self.path, orgId="org") as export:
+            coll_id = export.create_org_get_collection("Team A")
+            entry = dict(_entry("a"), organizationId="org", collectionIds=coll_id)
+            export.create_entry(None, entry)
+        with open(self.path, encoding="utf-8") as f:
+            document = json.load(f)
+
+        self.assertEqual([{"id": coll_id, "organizationId": "org", "name": "Team A", "externalId": None}], document["collections"])
+        self.assertEqual([coll_id], document["items"][0]["collectionIds"])
+
+    @mock.patch("kp2bw.export.EXPORT_KDF_ITERATIONS", 1000)
+    def test_password_protected_round_trip(self):
+        # notes of odd lengths move the cipher and base64 blocks around
+        entries = [("Team A" if i % 2 else None, _entry(f"entry {i}", "n" * (i * 37) + "ü")) for i in range(40)]
+        document = self.write(entries, password="export password")
+
+        self.assertTrue(document["encrypted"])
+        self.assertTrue(document["passwordProtected"])
+        self.assertEqual(1000, document["kdfIterations"])
+        self.assertNotIn("entry 1", json.dumps(document))
+
+        plain = _open_protected_export(document, "export password")
+        self.assertEqual([f"entry {i}" for i in range(40)], [item["name"] for item in plain["items"]])
+        self.assertEqual(entries[39][1]["notes"], plain["items"][39]["notes"])
+        self.assertEqual(["Team A"], [folder["name"] for folder in plain["folders"]])
+
+        with self.assertRaises(ValueError):
+            _open_protected_export(document, "wrong password")
+
+    @mock.patch("kp2bw.export.EXPORT_KDF_ITERATIONS", 1000)
+    def test_password_protected_empty_export(self):
+        plain = _open_protected_export(self.write([], password="pw"), "pw")
+        self.assertEqual({"encrypted": False, "folders": [], "items": []}, plain)
+
+    def test_failed_export_leaves_no_file(self):
+        with self.assertRaises(RuntimeError):
+            with BitwardenExport(self.path) as export:
+                export.create_entry(None, _entry("a"))
+                raise RuntimeError("interrupted")
+
+        self.assertEqual([], os.listdir(self.tmp.name))
+
+    def test_folders_after_entries(self):
+        with self.assertRaises(Exception):
+            with BitwardenExport(self.path) as export:
+                export.create_entry(None, _entry("a"))
+                export.create_folders({"late"})
+
+
+if __name__ == "__main__":
+    unittest.main()
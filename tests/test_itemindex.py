@@ -0,0 +1,52 @@
+import unittest
+
+from kp2bw.itemindex import ItemIndex
+
+
+def _item(item_id, name, folder_id=None, org=None, username="user", uri=None):
+    return {"id": item_id, "name": name, "folderId": folder_id, "organizationId": org,
+        "login": {"username": username, "uris": [{"uri": uri}] if uri else []}}
+
+
+class ItemIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ItemIndex.from_items([
+            _item("p1", "entry", "f1"),
+            _item("o1", "entry", "f1", org="org1", username="other"),
+            _item("p2", "root", uri="https://example.com"),
+        ], {"f1": "Team A"})
+
+    def test_items_are_kept_apart_by_organization(self):
+        self.assertEqual("p1", self.index.find("Team A", "entry"))
+        self.assertEqual("o1", self.index.find("Team A", "entry", org="org1"))
+        self.assertIsNone(self.index.find("Team A", "entry", org="org2"))
+        self.assertFalse(self.index.contains(None, "root", org="org1"))
+
+    def test_find_by_username_and_uri(self):
+        self.assertIsNone(self.index.find("Team A", "entry", username="other"))
+        self.assertEqual("o1", self.index.find("Team A", "entry", username="other", org="org1"))
+        self.assertEqual("p2", self.index.find(None, "root", uri="https://example.com"))
+        self.assertIsNone(self.index.find(None, "root", uri="https://other.example"))
+
+    def test_created_items(self):
+        self.index.add_item("Team A", _item("o2", "new", org="org1"), created=True)
+
+        self.assertFalse(self.index.contains("Team A", "new", include_created=False, org="org1"))
+        self.assertTrue(self.index.contains("Team A", "new", org="org1"))
+
+        self.index.settle_created()
+        self.assertTrue(self.index.contains("Team A", "new", include_created=False, org="org1"))
+
+    def test_records_round_trip(self):
+        self.index.add("Team A", "new", "o2", created=True, org="org1")
+        index = ItemIndex.from_records(self.index.to_records())
+
+        self.assertEqual(sorted(self.index.to_records(), key=str), sorted(index.to_records(), key=str))
+        self.assertEqual("o1", index.find("Team A", "entry", org="org1"))
+        self.assertFalse(index.contains("Team A", "new", include_created=False, org="org1"))
+        self.assertEqual(4, len(index))
+
+
+if __name__ == "__main__":
+    unittest.main()
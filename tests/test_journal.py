@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+import unittest
+
+from kp2bw.journal import Journal
+
+VAULT = {"folders": {"Team A": "f1"}, "items": [["Team A", "existing", "i0"]], "colls": None}
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory(prefix="kp2bw-test-")
+        self.path = os.path.join(self.tmp.name, "journal.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_run(self):
+        journal = Journal(self.path)
+        self.assertFalse(journal.resuming)
+        journal.start(json.loads(json.dumps(VAULT)))
+        journal.folder("Team B", "f2")
+        journal.item("KP1", "i1", "Team B", "first")
+        journal.attachment("i1", "abc", "cert.pem", "a1")
+        journal.entry_done("KP1")
+        journal.item("KP2", "i2", None, "second")
+        journal.close()
+
+    def test_replay(self):
+        self.write_run()
+
+        journal = Journal(self.path)
+        self.assertTrue(journal.resuming)
+        self.assertEqual({"Team A": "f1", "Team B": "f2"}, journal.vault["folders"])
+        self.assertEqual(VAULT["items"], journal.vault["items"])
+        self.assertEqual("i1", journal.item_id("KP1"))
+        self.assertEqual("i2", journal.item_id("KP2"))
+        self.assertIsNone(journal.item_id("KP3"))
+        self.assertEqual({"KP1"}, journal.done)
+        self.assertEqual([{"t": "attachment", "item": "i1", "sha256": "abc", "name": "cert.pem", "id": "a1"}], journal.attachments)
+        journal.close()
+
+    def test_torn_last_line(self):
+        self.write_run()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('{"t": "done", "kp": "KP')
+
+        journal = Journal(self.path)
+        self.assertEqual({"KP1"}, journal.done)
+        self.assertEqual("i2", journal.item_id("KP2"))
+
+        # what the resumed run writes survives the next resume
+        journal.entry_done("KP2")
+        journal.close()
+
+        journal = Journal(self.path)
+        self.assertEqual({"KP1", "KP2"}, journal.done)
+        journal.close()
+
+    def test_last_record_without_newline(self):
+        self.write_run()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('{"t": "item", "kp": "KP3", "id": "i3", "folder": null, "name": "third"}')
+
+        journal = Journal(self.path)
+        journal.entry_done("KP3")
+        journal.close()
+
+        journal = Journal(self.path)
+        self.assertEqual("i3", journal.item_id("KP3"))
+        self.assertEqual({"KP1", "KP3"}, journal.done)
+        journal.close()
+
+    def test_close_removes_a_complete_journal(self):
+        self.write_run()
+
+        Journal(self.path).close(remove=True)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_unsupported_version(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"t": "start", "version": 0, "vault": VAULT}) + "\n")
+
+        with self.assertRaises(Exception):
+            Journal(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
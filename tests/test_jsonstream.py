@@ -0,0 +1,59 @@
+import io
+import json
+import unittest
+
+from kp2bw.jsonstream import iter_json_array
+
+ITEMS = [
+    {"id": "1", "name": "a, b ] c", "notes": "{\"not\": [\"an\", \"element\"]}"},
+    12345678901234567890,
+    -1.5e-3,
+    "ümlaut",
+    [1, [2, [3]]],
+    None,
+    True,
+    {},
+]
+
+
+class IterJsonArrayTest(unittest.TestCase):
+
+    def parse(self, text, read_size):
+        return list(iter_json_array(io.StringIO(text), read_size=read_size))
+
+    def test_elements_across_chunk_boundaries(self):
+        for text in (json.dumps(ITEMS), json.dumps(ITEMS, indent=2), "\n  " + json.dumps(ITEMS, separators=(",", ":")) + "\n"):
+            for read_size in (1, 2, 3, 7, 64, 1 << 16):
+                self.assertEqual(ITEMS, self.parse(text, read_size), (text, read_size))
+
+    def test_number_at_the_end_of_a_chunk(self):
+        # "12" must not be yielded before "345" was read
+        self.assertEqual([12345, 6], self.parse("[12345,6]", 3))
+
+    def test_empty_array(self):
+        self.assertEqual([], self.parse("[]", 1))
+        self.assertEqual([], self.parse(" [ \n ] ", 2))
+
+    def test_elements_are_yielded_as_they_arrive(self):
+        stream = io.StringIO('[{"id": 1}, {"id": 2}')
+        elements = iter_json_array(stream, read_size=4)
+        self.assertEqual({"id": 1}, next(elements))
+        self.assertEqual({"id": 2}, next(elements))
+        with self.assertRaises(ValueError):
+            next(elements)
+
+    def test_not_an_array(self):
+        with self.assertRaises(ValueError):
+            self.parse('{"object": "list"}', 4)
+        with self.assertRaises(ValueError):
+            self.parse("You are not logged in.", 4)
+
+    def test_truncated(self):
+        with self.assertRaises(ValueError):
+            self.parse('[{"id": 1}, {"id"', 4)
+        with self.assertRaises(ValueError):
+            self.parse("", 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
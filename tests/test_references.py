@@ -0,0 +1,103 @@
+import base64
+import unittest
+import uuid
+from types import SimpleNamespace
+
+from lxml import etree
+
+from kp2bw.convert import Converter
+from kp2bw.references import ReferenceIndex, find_references, topological_order
+
+
+def _entry_element(strings, protected=()):
+    element = etree.Element("Entry")
+    etree.SubElement(element, "UUID").text = base64.b64encode(uuid.uuid4().bytes).decode("ascii")
+    for key, value in strings.items():
+        string = etree.SubElement(element, "String")
+        etree.SubElement(string, "Key").text = key
+        etree.SubElement(string, "Value", Protected="True" if key in protected else "False").text = value
+    return element
+
+
+class FindReferencesTest(unittest.TestCase):
+
+    def test_fields_with_refs(self):
+        references = find_references({
+            "Title": "plain",
+            "UserName": "{REF:U@I:cfc0141068e83547bceeaf0c1adabae0}",
+            "Notes": "see {ref:a@t:Target} and {REF:P@U:admin}",
+            "custom": "{REF:P@I:CFC0141068E83547BCEEAF0C1ADABAE0}",
+        })
+
+        self.assertEqual({
+            "username": [("U", "I", "cfc0141068e83547bceeaf0c1adabae0")],
+            "notes": [("A", "T", "Target"), ("P", "U", "admin")],
+        }, references)
+
+    def test_no_refs(self):
+        self.assertEqual({}, find_references({"Title": "{REF: broken", "Password": None}))
+
+
+class ReferenceIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ReferenceIndex({"I", "U", "T"})
+        self.first = SimpleNamespace(title="Target", username="admin", password="secret", url=None, notes=None)
+        self.second = SimpleNamespace(title="Other", username="Admin", password="other", url=None, notes=None)
+        self.index.add("AAAA", self.first, {"Title": "Target", "UserName": "admin"})
+        self.index.add("BBBB", self.second, {"Title": "Other", "UserName": "Admin"})
+
+    def test_lookup_by_id(self):
+        self.assertEqual("AAAA", self.index.lookup("I", "aaaa"))
+        self.assertIsNone(self.index.lookup("I", "CCCC"))
+
+    def test_lookup_by_value_ignores_case_and_first_match_wins(self):
+        self.assertEqual("AAAA", self.index.lookup("T", "TARGET"))
+        self.assertEqual("AAAA", self.index.lookup("U", "ADMIN"))
+        self.assertIsNone(self.index.lookup("T", "missing"))
+
+    def test_value(self):
+        self.assertIs(self.second, self.index.entry("BBBB"))
+        self.assertEqual("secret", self.index.value("AAAA", "P"))
+        self.assertEqual("", self.index.value("AAAA", "A"))
+        self.assertEqual("AAAA", self.index.value("AAAA", "I"))
+
+
+class TopologicalOrderTest(unittest.TestCase):
+
+    def test_dependencies_come_first(self):
+        order, cyclic = topological_order({"c": {"b"}, "b": {"a"}, "a": set(), "d": set()})
+
+        self.assertEqual([], cyclic)
+        self.assertEqual({"a", "b", "c", "d"}, set(order))
+        self.assertLess(order.index("a"), order.index("b"))
+        self.assertLess(order.index("b"), order.index("c"))
+
+    def test_cycles(self):
+        order, cyclic = topological_order({
+            "a": {"b"},
+            "b": {"a"},
+            # behind the cycle
+            "c": {"a"},
+            "self": {"self"},
+            "free": set(),
+        })
+
+        self.assertEqual(["free"], order)
+        self.assertEqual(["a", "b", "c", "self"], cyclic)
+
+
+class RefEntryTransformTest(unittest.TestCase):
+
+    def test_ref_entry_keeps_protected_fields(self):
+        converter = Converter(None, None, None, None, None, None, False, 0, None)
+        element = _entry_element({"Title": "entry", "Notes": "see {REF:T@I:CFC0141068E83547BCEEAF0C1ADABAE0}",
+            "hidden": "h", "visible": "v"}, protected={"hidden"})
+
+        item, long_fields, binaries = converter._transform_entry(element, (None, "", None), True)
+
+        self.assertEqual([("hidden", "h", 1), ("visible", "v", 0)], item.fields)
+
+
+if __name__ == "__main__":
+    unittest.main()
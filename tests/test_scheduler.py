@@ -0,0 +1,96 @@
+import unittest
+
+from kp2bw.scheduler import OK, PERMANENT, THROTTLED, TRANSIENT, RequestScheduler, classify
+
+
+class _Calls():
+    """A bw call answering with the given (ok, output) results in turn."""
+
+    def __init__(self, *results):
+        self._results = list(results)
+        self.count = 0
+
+    def __call__(self):
+        self.count += 1
+        return self._results.pop(0) if len(self._results) > 1 else self._results[0]
+
+
+class ClassifyTest(unittest.TestCase):
+
+    def test_ok(self):
+        self.assertEqual(OK, classify(True, "error: 429 but the call succeeded"))
+
+    def test_status(self):
+        self.assertEqual(THROTTLED, classify(False, "error: 429 Too Many Requests"))
+        self.assertEqual(THROTTLED, classify(False, "Response status code does not indicate success: 503 (Service Unavailable)."))
+        self.assertEqual(TRANSIENT, classify(False, "error: 502"))
+        self.assertEqual(PERMANENT, classify(False, "error: 404 Not found."))
+
+    def test_message(self):
+        self.assertEqual(THROTTLED, classify(False, "connect ECONNREFUSED 127.0.0.1:8087"))
+        self.assertEqual(THROTTLED, classify(False, "Rate limited, try again later"))
+        self.assertEqual(TRANSIENT, classify(False, "request to https://vault.example failed, reason: socket hang up"))
+        self.assertEqual(TRANSIENT, classify(False, "TypeError: fetch failed"))
+        self.assertEqual(PERMANENT, classify(False, "Invalid master password."))
+
+    def test_digits_in_ids_are_no_status(self):
+        self.assertEqual(PERMANENT, classify(False, "Item 7f3a4290-5031-4c2b not found."))
+        self.assertEqual(PERMANENT, classify(False, "Unknown custom field 5003"))
+        self.assertEqual(PERMANENT, classify(False, "error: 400 Folder 503 does not exist."))
+
+
+class RequestSchedulerTest(unittest.TestCase):
+
+    def scheduler(self, **kwargs):
+        return RequestScheduler(base_delay=0, **kwargs)
+
+    def test_throttled_calls_are_retried_for_every_command(self):
+        scheduler = self.scheduler(max_concurrency=4)
+        call = _Calls((False, "error: 429 Too Many Requests"), (True, "{}"))
+
+        self.assertEqual((True, "{}"), scheduler.run("create item", call))
+        self.assertEqual(2, call.count)
+        self.assertEqual((1, 1), (scheduler.retries, scheduler.throttled))
+        self.assertEqual(2, scheduler.limit)
+
+    def test_transient_failures_are_retried_only_when_idempotent(self):
+        scheduler = self.scheduler()
+        call = _Calls((False, "error: 502"), (True, "[]"))
+        self.assertEqual((True, "[]"), scheduler.run("list items", call))
+        self.assertEqual(2, call.count)
+
+        call = _Calls((False, "error: 502"), (True, "{}"))
+        self.assertEqual((False, "error: 502"), scheduler.run("create item", call))
+        self.assertEqual(1, call.count)
+
+    def test_permanent_failures_are_not_retried(self):
+        call = _Calls((False, "error: 404 Not found."))
+        self.assertEqual((False, "error: 404 Not found."), self.scheduler().run("edit item", call))
+        self.assertEqual(1, call.count)
+
+    def test_retries_are_limited(self):
+        scheduler = self.scheduler(max_retries=3)
+        call = _Calls((False, "error: 503 Service Unavailable"))
+
+        self.assertEqual((False, "error: 503 Service Unavailable"), scheduler.run("sync", call))
+        self.assertEqual(4, call.count)
+        self.assertEqual(3, scheduler.retries)
+
+    def test_limit_recovers_after_healthy_calls(self):
+        scheduler = self.scheduler(max_concurrency=2, max_retries=0)
+        scheduler.run("list items", _Calls((False, "error: 429")))
+        self.assertEqual(1, scheduler.limit)
+
+        scheduler.run("list items", _Calls((True, "[]")))
+        self.assertEqual(2, scheduler.limit)
+
+    def test_backoff_is_capped(self):
+        scheduler = RequestScheduler(base_delay=1.0, max_delay=8.0)
+        for attempt in range(10):
+            for _ in range(20):
+                self.assertLessEqual(0, scheduler._backoff(attempt))
+                self.assertLessEqual(scheduler._backoff(attempt), min(8.0, 2 ** attempt))
+
+
+if __name__ == "__main__":
+    unittest.main()